@@ -12,7 +12,8 @@ echo "Py time: $SECONDS"
 if [[ "$COMPILE" !=  "" ]]; then
 	echo "$COMPILE"
 else
-	FORMAL="sby -f ${dir}alu.sby"
+	python3 ${dir}sby.py alu $1 ${2:+--mode $2} > alu.sby
+	FORMAL="sby -f alu.sby"
 	RESULT=$($FORMAL | grep 'DONE\|Assert failed')
 	echo "$RESULT"
 	echo "Total time: $SECONDS"
@@ -1,8 +1,8 @@
-# alu.py: A big endian ALU and a module that converts it to little. self checking
+# alu.py: The ALU, it works on the register encoding directly. self checking
 # Copyright (C) 2021 Martín Bárez <martinbarez>
 
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from nmigen import Cat, Const, Elaboratable, Module, Mux, ResetSignal, Signal
 from nmigen.asserts import Assert, Assume, Cover, Initial, Past
@@ -34,6 +34,26 @@ class Operation(Enum):
     DIV = 0x11
 
 
+class Multiplier(Enum):
+    """How MUL computes the product during counts 0 to 7"""
+
+    ITERATIVE = "iterative"  # one bit of inputb per cycle
+    RADIX4 = "radix4"  # two bits of inputb per cycle, then idles
+    DSP = "dsp"  # a single multiply for the DSP blocks, then idles
+
+
+class Divider(Enum):
+    """How DIV computes each of its 9 steps during counts 2 to 10"""
+
+    COMPARE = "compare"  # 17 bit compare then subtract, one copy per count
+    SUBTRACT = "subtract"  # a shared 17 bit subtractor, its borrow is the compare
+    NARROW = "narrow"  # a shared 8 bit subtractor on the bits X is shifted to
+
+
+# counts MUL computes for, the rest of counts 0 to 7 idle
+MUL_STEPS = {Multiplier.ITERATIVE: 8, Multiplier.RADIX4: 4, Multiplier.DSP: 1}
+
+
 # TODO
 # 16-bit Data Transmission Operations
 # 16-bit Arithmetic Operations
@@ -42,7 +62,13 @@ class Operation(Enum):
 
 
 class ALU_big(Elaboratable):
-    def __init__(self, verification: Operation = None):
+    def __init__(
+        self,
+        verification: Operation = None,
+        multiplier: Multiplier = Multiplier.ITERATIVE,
+        divider: Divider = Divider.COMPARE,
+        turbo: bool = False,
+    ):
         self.inputa = Signal(8)
         self.inputb = Signal(8)
         self.result = Signal(8)
@@ -60,11 +86,19 @@ class ALU_big(Elaboratable):
         self.partial_hi = self.partial[8:16]
         self.partial_lo = self.partial[0:8]
 
+        self.multiplier = multiplier
+        self.divider = divider
+        self.turbo = turbo  # skip the idle counts, see steps
         self.verification = verification
 
     def ports(self) -> List[Signal]:
         return [self.inputa, self.inputb, self.oper, self.result]
 
+    def steps(self) -> Dict[Operation, int]:
+        """Counts each multi cycle operation computes for before its result comes
+        out. With turbo the count after the last one is the first output count"""
+        return {Operation.MUL: MUL_STEPS[self.multiplier], Operation.DIV: 11}
+
     def elaborate(self, platform: Platform) -> Module:
         m = Module()
 
@@ -463,20 +497,48 @@ class ALU_big(Elaboratable):
                     with m.If(~Initial()):
                         m.d.comb += [Assert(False)]
 
-            # could be optimized with shift to right
+            # every multiplier has the product in partial by count 8
             with m.Case(Operation.MUL):
                 with m.Switch(self.count):
-                    for i in range(0, 8):
-                        with m.Case(i):
-                            prod = self.inputa * self.inputb[i]
-                            if i == 0:
-                                prod = Cat(prod[0:7], ~prod[7], Const(1))
-                            elif i == 7:
-                                prod = Cat(~prod[0:7], prod[7], Const(1))
-                            else:
-                                prod = Cat(prod[0:7], ~prod[7])
-                            m.d.sync += self.partial.eq(self.partial + (prod << i))
-                            m.d.sync += self.count.eq(i + 1)
+                    if self.multiplier is Multiplier.ITERATIVE:
+                        # could be optimized with shift to right
+                        for i in range(0, 8):
+                            with m.Case(i):
+                                prod = self.inputa * self.inputb[i]
+                                if i == 0:
+                                    prod = Cat(prod[0:7], ~prod[7], Const(1))
+                                elif i == 7:
+                                    prod = Cat(~prod[0:7], prod[7], Const(1))
+                                else:
+                                    prod = Cat(prod[0:7], ~prod[7])
+                                m.d.sync += self.partial.eq(self.partial + (prod << i))
+                                m.d.sync += self.count.eq(i + 1)
+
+                    elif self.multiplier is Multiplier.RADIX4:
+                        for i in range(0, 4):
+                            with m.Case(i):
+                                # the top digit carries the sign of inputb
+                                digit = self.inputb[2 * i : 2 * i + 2]
+                                if i == 3:
+                                    digit = digit.as_signed()
+                                prod = self.inputa.as_signed() * digit
+                                m.d.sync += self.partial.eq(
+                                    self.partial + (prod << 2 * i)
+                                )
+                                done = self.turbo and i == 3
+                                m.d.sync += self.count.eq(8 if done else i + 1)
+                        with m.Case(4, 5, 6, 7):
+                            m.d.sync += self.count.eq(self.count + 1)
+
+                    elif self.multiplier is Multiplier.DSP:
+                        with m.Case(0):
+                            m.d.sync += self.partial.eq(
+                                self.inputa.as_signed() * self.inputb.as_signed()
+                            )
+                            m.d.sync += self.count.eq(8 if self.turbo else 1)
+                        with m.Case(1, 2, 3, 4, 5, 6, 7):
+                            m.d.sync += self.count.eq(self.count + 1)
+
                     with m.Case(8):
                         m.d.sync += self.partial_hi.eq(self.partial_lo)
                         m.d.sync += self.count.eq(9)
@@ -516,13 +578,34 @@ class ALU_big(Elaboratable):
                             Assert((Past(self.count) == 0) | (Past(self.count) == 9)),
                         ]
                     with m.If(~Initial() & (self.count != 0)):
+                        step = self.count == Past(self.count) + 1
+                        if self.turbo:
+                            step |= self.count == 8
                         m.d.comb += [
-                            Assert(self.count == Past(self.count) + 1),
+                            Assert(step),
                             Assume(self.inputa == Past(self.inputa)),
                             Assume(self.inputb == Past(self.inputb)),
                         ]
 
             with m.Case(Operation.DIV):
+                if self.divider is not Divider.COMPARE:
+                    # rotate yva left, bit 16 wraps around into bit 0
+                    yva = Cat(self.carry, self.partial)
+                    step = Signal(17)
+                    if self.divider is Divider.SUBTRACT:
+                        diff = Signal(18)
+                        m.d.comb += diff.eq(yva - (self.inputb << 9))
+                        bit = yva[0] ^ ~diff[17]
+                        m.d.comb += step.eq(Cat(bit, Mux(bit, diff, yva)[1:17]))
+                    elif self.divider is Divider.NARROW:
+                        # X << 9 only reaches bits 9 to 16, the rest is kept
+                        diff = Signal(9)
+                        m.d.comb += diff.eq(yva[9:17] - self.inputb)
+                        bit = yva[0] ^ ~diff[8]
+                        m.d.comb += step.eq(
+                            Cat(bit, yva[1:9], Mux(bit, diff[0:8], yva[9:17]))
+                        )
+
                 with m.Switch(self.count):
                     with m.Case(0):
                         m.d.sync += self.partial_hi.eq(self.inputa)  # Y
@@ -535,29 +618,35 @@ class ALU_big(Elaboratable):
                             Mux(self.partial_hi[0:4] >= self.inputb[0:4], 1, 0)
                         )
 
-                    for i in range(2, 11):
-                        with m.Case(i):
-                            tmp1_w = Cat(self.partial << 1, self.carry)
-                            tmp1_x = Signal(17)
-                            tmp1_y = Signal(17)
-                            tmp1_z = Signal(17)
-                            tmp2 = self.inputb << 9
+                    if self.divider is Divider.COMPARE:
+                        for i in range(2, 11):
+                            with m.Case(i):
+                                tmp1_w = Cat(self.partial << 1, self.carry)
+                                tmp1_x = Signal(17)
+                                tmp1_y = Signal(17)
+                                tmp1_z = Signal(17)
+                                tmp2 = self.inputb << 9
+
+                                m.d.comb += tmp1_x.eq(tmp1_w)
+                                with m.If(tmp1_w & 0x20000):
+                                    m.d.comb += tmp1_x.eq((tmp1_w & 0x1FFFF) | 1)
 
-                            m.d.comb += tmp1_x.eq(tmp1_w)
-                            with m.If(tmp1_w & 0x20000):
-                                m.d.comb += tmp1_x.eq((tmp1_w & 0x1FFFF) | 1)
+                                m.d.comb += tmp1_y.eq(tmp1_x)
+                                with m.If(tmp1_x >= tmp2):
+                                    m.d.comb += tmp1_y.eq(tmp1_x ^ 1)
 
-                            m.d.comb += tmp1_y.eq(tmp1_x)
-                            with m.If(tmp1_x >= tmp2):
-                                m.d.comb += tmp1_y.eq(tmp1_x ^ 1)
+                                m.d.comb += tmp1_z.eq(tmp1_y)
+                                with m.If(tmp1_y & 1):
+                                    m.d.comb += tmp1_z.eq((tmp1_y - tmp2) & 0x1FFFF)
 
-                            m.d.comb += tmp1_z.eq(tmp1_y)
-                            with m.If(tmp1_y & 1):
-                                m.d.comb += tmp1_z.eq((tmp1_y - tmp2) & 0x1FFFF)
+                                m.d.sync += Cat(self.partial, self.carry).eq(tmp1_z)
 
-                            m.d.sync += Cat(self.partial, self.carry).eq(tmp1_z)
+                                m.d.sync += self.count.eq(i + 1)
 
-                            m.d.sync += self.count.eq(i + 1)
+                    else:
+                        with m.Case(*range(2, 11)):
+                            m.d.sync += Cat(self.partial, self.carry).eq(step)
+                            m.d.sync += self.count.eq(self.count + 1)
 
                     with m.Case(11):
                         m.d.sync += self.count.eq(12)
@@ -586,39 +675,14 @@ class ALU_big(Elaboratable):
         return m
 
 
-class ALU(Elaboratable):
-    def __init__(self, verification: Operation = None):
-        self.inputa = Signal(8)
-        self.inputb = Signal(8)
-        self.result = Signal(8)
-        self.oper = Signal(Operation)
-
-        self.PSW = Status()
-
-        self.verification = verification
-
-    def ports(self) -> List[Signal]:
-        return [self.inputa, self.inputb, self.oper, self.result]
-
-    def elaborate(self, platform: Platform) -> Module:
-        m = Module()
-
-        m.submodules.big = big = ALU_big(self.verification)
-
-        m.d.comb += [
-            big.inputa.eq(Cat(self.inputa[:4], self.inputa[4:])),
-            big.inputb.eq(Cat(self.inputb[:4], self.inputb[4:])),
-            big.oper.eq(self.oper),
-            self.result.eq(Cat(big.result[:4], big.result[4:])),
-            self.PSW.eq(big.PSW),
-        ]
-
-        return m
-
-
 if __name__ == "__main__":
     parser = main_parser()
     parser.add_argument("--oper")
+    parser.add_argument(
+        "--mul", choices=[x.value for x in Multiplier], default="iterative"
+    )
+    parser.add_argument("--div", choices=[x.value for x in Divider], default="compare")
+    parser.add_argument("--turbo", action="store_true", help="skip the idle counts")
     args = parser.parse_args()
 
     oper: Optional[Operation] = None
@@ -626,7 +690,9 @@ if __name__ == "__main__":
         oper = Operation[args.oper]
 
     m = Module()
-    m.submodules.alu = alu = ALU_big(oper)
+    m.submodules.alu = alu = ALU_big(
+        oper, Multiplier(args.mul), Divider(args.div), args.turbo
+    )
 
     if oper is not None:
         m.d.comb += Assume(~ResetSignal())
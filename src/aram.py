@@ -0,0 +1,67 @@
+# aram.py: 64 KiB audio RAM connected to the CPU bus
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+from typing import List
+
+from nmigen import Elaboratable, Memory, Module, Signal
+from nmigen.build import Platform
+from nmigen.hdl.ast import Assign
+
+
+class ARAM(Elaboratable):
+    def __init__(self, init: bytes = b""):
+        if len(init) > 0x10000:
+            raise ValueError(f"ARAM holds 64 KiB, got {len(init)} bytes")
+
+        # named from the core's side like Core itself
+        self.addr = Signal(16)
+        self.din = Signal(8)  # written by the core
+        self.dout = Signal(8)  # read by the core
+        self.RWB = Signal(reset=1)  # 1 = read, 0 = write
+        self.enable = Signal(reset=1)
+
+        # a second read port, for the DSP
+        self.dsp_addr = Signal(16)
+        self.dsp_data = Signal(8)
+
+        self.mem = Memory(width=8, depth=0x10000, init=init)
+
+    @classmethod
+    def from_file(cls, path: str) -> "ARAM":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def ports(self) -> List[Signal]:
+        return [self.addr, self.din, self.dout, self.RWB, self.enable]
+
+    def connect(self, core) -> List[Assign]:
+        return [
+            self.addr.eq(core.addr),
+            self.din.eq(core.din),
+            self.RWB.eq(core.RWB),
+            self.enable.eq(core.enable),
+            core.dout.eq(self.dout),
+        ]
+
+    def connect_dsp(self, dsp) -> List[Assign]:
+        return [self.dsp_addr.eq(dsp.addr), dsp.data.eq(self.dsp_data)]
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+
+        # the core samples dout in the same cycle it drives addr
+        m.submodules.read = read = self.mem.read_port(domain="comb")
+        m.submodules.write = write = self.mem.write_port()
+        m.submodules.dsp_read = dsp_read = self.mem.read_port(domain="comb")
+
+        m.d.comb += [
+            read.addr.eq(self.addr),
+            self.dout.eq(read.data),
+            write.addr.eq(self.addr),
+            write.data.eq(self.din),
+            write.en.eq(self.enable & ~self.RWB),
+            dsp_read.addr.eq(self.dsp_addr),
+            self.dsp_data.eq(dsp_read.data),
+        ]
+
+        return m
@@ -0,0 +1,72 @@
+# bus.py: Software model of the 64 KiB ARAM for simulation, backed by NumPy
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+from typing import Callable, Generator, Union
+
+import numpy as np
+from nmigen.sim import Passive, Settle, Tick
+
+SIZE = 0x10000
+
+
+class BusModel:
+    """Answers the bus of a Core from a uint8 array, in a simulator process. Unlike
+    ARAM the contents are not part of the design, so a new program needs no new
+    elaboration or CXXRTL build. Works on both Simulator and CxxSimulator."""
+
+    def __init__(self, init: Union[bytes, bytearray, np.ndarray] = b""):
+        self.mem = np.zeros(SIZE, dtype=np.uint8)
+        self.load(init)
+
+    @classmethod
+    def from_file(cls, path: str) -> "BusModel":
+        return cls(np.fromfile(path, dtype=np.uint8))
+
+    def load(self, data: Union[bytes, bytearray, np.ndarray], addr: int = 0):
+        """Copy data in at addr in one go, wrapping around at the end like the PC"""
+        if not isinstance(data, np.ndarray):
+            data = np.frombuffer(data, dtype=np.uint8)
+        if len(data) > SIZE:
+            raise ValueError(f"ARAM holds 64 KiB, got {len(data)} bytes")
+        first = min(len(data), SIZE - addr)
+        self.mem[addr : addr + first] = data[:first]
+        self.mem[: len(data) - first] = data[first:]
+
+    def dump(self, addr: int = 0, length: int = SIZE) -> np.ndarray:
+        """A view of the memory, not a copy, it follows later writes. Unlike load
+        it does not wrap around"""
+        return self.mem[addr : addr + length]
+
+    def save(self, path: str):
+        self.mem.tofile(path)
+
+    def process(self, core) -> Callable[[], Generator]:
+        """Simulator process serving the core, it writes din in place"""
+        mem = self.mem
+
+        def process():
+            yield Passive()
+            while True:
+                yield Settle()
+                addr = yield core.addr
+                yield core.dout.eq(mem.item(addr))
+                if (yield core.enable) and not (yield core.RWB):
+                    mem[addr] = yield core.din
+                yield Tick()
+
+        return process
+
+    def dsp_process(self, dsp) -> Callable[[], Generator]:
+        """Simulator process answering the reads of a DSP, from the same memory as
+        the core so it hears what the core writes"""
+        mem = self.mem
+
+        def process():
+            yield Passive()
+            while True:
+                yield Settle()
+                addr = yield dsp.addr
+                yield dsp.data.eq(mem.item(addr))
+                yield Tick()
+
+        return process
@@ -0,0 +1,57 @@
+# cache.py: Content addressed on-disk cache of formal verification results
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+import json
+import os
+import shutil
+from hashlib import sha256
+from typing import NamedTuple, Optional
+
+# answers of the solver, anything else may change on the next run
+DEFINITIVE = ("PASS", "FAIL")
+
+
+class Entry(NamedTuple):
+    status: str  # PASS or FAIL
+    trace: str  # counterexample, empty when there is none
+
+
+class ProofCache:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(il: str, sby: str) -> str:
+        """Hash the RTLIL and sby config, src attributes only move with line numbers"""
+        h = sha256()
+        for line in il.splitlines():
+            if not line.lstrip().startswith("attribute \\src"):
+                h.update(line.encode())
+                h.update(b"\n")
+        h.update(sby.encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Entry]:
+        try:
+            with open(os.path.join(self.directory, f"{key}.json")) as f:
+                entry = Entry(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+        if entry.status not in DEFINITIVE:
+            return None
+        if entry.trace and not os.path.exists(entry.trace):
+            return None
+        return entry
+
+    def put(self, key: str, status: str, trace: str = ""):
+        """Store a result, the trace is copied so it outlives the sby workdir.
+        Errors and timeouts are not stored, the next run tries again"""
+        if status not in DEFINITIVE:
+            return
+        if trace:
+            kept = os.path.join(self.directory, f"{key}.vcd")
+            shutil.copy(trace, kept)
+            trace = kept
+        with open(os.path.join(self.directory, f"{key}.json"), "w") as f:
+            json.dump(Entry(status, trace)._asdict(), f)
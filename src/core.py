@@ -2,64 +2,137 @@
 # Copyright (C) 2021 Martín Bárez <martinbarez>
 
 from sys import modules
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
-from nmigen import ClockSignal, Elaboratable, Module, Mux, ResetSignal, Signal
-from nmigen.asserts import AnyConst, Assume, Cover, Fell, Initial
+from nmigen import Cat, ClockSignal, Elaboratable, Module, Mux, ResetSignal, Signal
+from nmigen.asserts import AnyConst, Assert, Assume, Cover, Fell, Initial, Past
 from nmigen.build import Platform
 from nmigen.cli import main_parser, main_runner
-from nmigen.sim import Simulator
 
-from alu import ALU, Operation
+from alu import ALU_big, Divider, Multiplier
 from instruction import Instruction, implemented
-from registers import Registers, add16
+from microcode import Sequencer, Source, Writeback
+from pc import PCUnit
+from registers import Registers
 from snapshot import Snapshot
 
+if TYPE_CHECKING:
+    from counters import Counters
+
 
 class Core(Elaboratable):
-    def __init__(self, verification: Instruction = None):
+    def __init__(
+        self,
+        verification: Instruction = None,
+        reg: Registers = None,
+        instructions: List[Instruction] = None,
+        multiplier: Multiplier = Multiplier.ITERATIVE,
+        divider: Divider = Divider.COMPARE,
+        prefetch: bool = False,
+        turbo: bool = False,
+        counters: Optional["Counters"] = None,
+    ):
+        # registers, their reset values are the state the core starts in
+        self.reg = reg if reg is not None else Registers()
+        self.tmp = Signal(8)  # temp signal when reading 16 bits
+
         self.enable = Signal(reset=1)
-        self.addr = Signal(16)
+        self.addr = Signal(16, reset=self.reg.PC.reset)  # first opcode fetch
         self.din = Signal(8)
         self.dout = Signal(8)
         self.RWB = Signal(reset=1)  # 1 = read, 0 = write
 
-        # registers
-        self.reg = Registers()
-        self.tmp = Signal(8)  # temp signal when reading 16 bits
-
         # internal exec state
         self.opcode = Signal(8)
         self.cycle = Signal(4, reset=1)
 
+        # opcodes without one of these only fetch, a check needs just its own
+        if instructions is None and verification is not None:
+            instructions = [verification]
+        elif instructions is None:
+            instructions = implemented.implemented
+        self.instructions = instructions
+        self.multiplier = multiplier
+        self.divider = divider
+        self.prefetch = prefetch  # read the next opcode early, not cycle accurate
+        self.turbo = turbo  # skip the idle cycles of MUL, not cycle accurate
+        self.counters = counters  # performance counters, read by the debug port
+
         # formal verification
         self.verification = verification
-        self.snapshot = Snapshot()
+        if verification is not None:
+            self.snapshot = Snapshot(verification.reads, verification.writes)
+        else:
+            self.snapshot = Snapshot()
 
     def ports(self) -> List[Signal]:
-        return [self.addr, self.din, self.dout, self.RWB]
+        ports = [self.addr, self.din, self.dout, self.RWB]
+        if self.counters is not None:
+            ports += self.counters.ports()
+        return ports
 
     def elaborate(self, platform: Platform) -> Module:
         m = Module()
 
-        m.submodules.alu = self.alu = ALU()
+        m.submodules.alu = self.alu = ALU_big(
+            multiplier=self.multiplier, divider=self.divider, turbo=self.turbo
+        )
+        steps = self.alu.steps() if self.turbo else None
+        m.submodules.sequencer = seq = Sequencer(
+            self.instructions, self.prefetch, steps
+        )
+        m.submodules.pc = pcu = PCUnit(self.reg.PC)
 
         """Fetch the opcode, common for all instr"""
         m.d.sync += self.opcode.eq(Mux(self.cycle == 1, self.dout, self.opcode))
+        m.d.comb += [seq.opcode.eq(self.dout), seq.start.eq(self.cycle == 1)]
 
-        with m.Switch(Mux(self.cycle == 1, self.dout, self.opcode)):
-            for i in implemented.implemented:
-                with m.Case(i.opcode):
-                    i.synth(self, m)
-            with m.Default():
-                m.d.comb += core.alu.oper.eq(Operation.NOP)
-                m.d.sync += [
-                    core.reg.PC.eq(add16(core.reg.PC, 1)),
-                    core.enable.eq(1),
-                    core.addr.eq(add16(core.reg.PC, 1)),
-                    core.RWB.eq(1),
-                    core.cycle.eq(1),
-                ]
+        """Execute the microcode of this cycle"""
+        uop = seq.uop
+        sources = {
+            Source.ZERO: 0,
+            Source.A: self.reg.A,
+            Source.Y: self.reg.Y,
+            Source.DOUT: self.dout,
+        }
+        for select, port in [(uop.a, self.alu.inputa), (uop.b, self.alu.inputb)]:
+            with m.Switch(select):
+                for source, value in sources.items():
+                    with m.Case(source):
+                        m.d.comb += port.eq(value)
+        m.d.comb += self.alu.oper.eq(uop.oper)
+
+        m.d.comb += [
+            pcu.control.eq(uop.pc),
+            pcu.source.eq(uop.addr),
+            pcu.target.eq(Cat(self.tmp, self.dout)),
+        ]
+
+        m.d.sync += [
+            self.reg.PC.eq(pcu.next),
+            self.addr.eq(pcu.addr),
+            self.enable.eq(uop.enable),
+            self.RWB.eq(uop.RWB),
+            self.cycle.eq(Mux(uop.last, 1, self.cycle + 1)),
+        ]
+        with m.If(uop.din):
+            m.d.sync += self.din.eq(self.reg.A)
+        with m.If(uop.tmp):
+            m.d.sync += self.tmp.eq(self.dout)
+        with m.Switch(uop.writeback):
+            with m.Case(Writeback.A):
+                m.d.sync += self.reg.A.eq(self.alu.result)
+            with m.Case(Writeback.Y):
+                m.d.sync += self.reg.Y.eq(self.alu.result)
+
+        if self.counters is not None:
+            m.submodules.counters = self.counters
+            m.d.comb += [
+                self.counters.start.eq(self.cycle == 1),
+                self.counters.opcode.eq(self.dout),
+                self.counters.enable.eq(self.enable),
+                self.counters.RWB.eq(self.RWB),
+            ]
 
         if self.verification is not None:
             self.verify(m)
@@ -106,9 +179,42 @@ class Core(Elaboratable):
             self.verification.check(m, self.snapshot, self.alu)
 
 
+# Test program, unused memory reads as 0xFF
+program = bytearray(b"\xff" * 0x10000)
+program[0x0000:0x0003] = b"\x5f\x34\x12"  # JMP !$1234
+program[0x1234:0x1237] = b"\x5f\x00\x00"  # JMP !$0000
+
+
 if __name__ == "__main__":
+    # only the HDL above is imported by a formal build, the simulation needs more
+    from counters import Counter, Counters
+
     parser = main_parser()
     parser.add_argument("--instr")
+    parser.add_argument(
+        "--mul", choices=[x.value for x in Multiplier], default="iterative"
+    )
+    parser.add_argument("--div", choices=[x.value for x in Divider], default="compare")
+    parser.add_argument("--backend", choices=["pysim", "cxxrtl"], default="pysim")
+    parser.add_argument("--program", help="64 KiB ARAM image to run")
+    parser.add_argument("--dump", help="write the ARAM image here after the run")
+    parser.add_argument("--cycles", type=int, default=16)
+    parser.add_argument("--trace", help="waveform file: .vcd, .vcd.gz or .fst")
+    parser.add_argument(
+        "--signals", nargs="+", default=["bus"], help="groups or group.name to trace"
+    )
+    parser.add_argument("--start", type=int, default=0, help="first cycle traced")
+    parser.add_argument("--stop", type=int, help="cycle the trace ends before")
+    parser.add_argument("--profile", help="collapsed stacks of the cycles per opcode")
+    parser.add_argument(
+        "--prefetch", action="store_true", help="fetch opcodes early, fewer cycles"
+    )
+    parser.add_argument(
+        "--turbo", action="store_true", help="skip idle cycles of MUL, fewer cycles"
+    )
+    parser.add_argument(
+        "--counters", action="store_true", help="read out the performance counters"
+    )
     args = parser.parse_args()
 
     instr: Optional[Instruction] = None
@@ -119,11 +225,20 @@ if __name__ == "__main__":
             raise AttributeError()
 
     m = Module()
-    m.submodules.core = core = Core(instr)
+    m.submodules.core = core = Core(
+        instr,
+        multiplier=Multiplier(args.mul),
+        divider=Divider(args.div),
+        prefetch=args.prefetch,
+        turbo=args.turbo,
+        counters=Counters() if args.counters else None,
+    )
 
     if instr is not None:
-        time = Signal(6, reset_less=True)
-        m.d.sync += time.eq(time + 1)
+        # stops at 4 so the assumptions below hold once, even for unbounded proofs
+        time = Signal(range(5), reset_less=True)
+        with m.If(time != 4):
+            m.d.sync += time.eq(time + 1)
 
         with m.If(Initial()):
             m.d.sync += Assume(ResetSignal())
@@ -138,48 +253,70 @@ if __name__ == "__main__":
             m.d.sync += Assume(core.snapshot.taken)
         m.d.sync += Cover(Fell(core.snapshot.taken))
 
+        # invariant for k-induction: every fetch after reset reads the opcode at
+        # PC, so a proof cannot start from a fetch that no instruction leads to
+        with m.If(~Initial() & ~Past(ResetSignal()) & (core.cycle == 1)):
+            m.d.comb += Assert(core.enable & core.RWB & (core.addr == core.reg.PC))
+
         main_runner(
             parser, args, m, ports=core.ports() + [ClockSignal(), ResetSignal()]
         )
 
     else:
-        # Fake memory
-        mem = {
-            0x0000: 0x5F,
-            0x1000: 0x12,
-            0x2000: 0x34,
-            0x1234: 0x5F,
-            0x1334: 0x00,
-            0x1434: 0x00,
-        }
-        with m.Switch(core.addr):
-            for addr, data in mem.items():
-                with m.Case(addr):
-                    m.d.comb += core.dout.eq(data)
-            with m.Default():
-                m.d.comb += core.dout.eq(0xFF)
-
-        sim = Simulator(m)
+        from nmigen.sim import Settle, Simulator
+
+        from bus import BusModel
+        from cxxsim import CxxSimulator
+        from profiler import Profiler
+
+        # the program is not part of the design, changing it needs no new build
+        bus = BusModel(program)
+        if args.program is not None:
+            bus = BusModel.from_file(args.program)
+
+        sim = CxxSimulator(m) if args.backend == "cxxrtl" else Simulator(m)
+        sim.add_process(bus.process(core))
         sim.add_clock(1e-6, domain="sync")
 
         def process():
-            yield
-            yield
-            yield
-            yield
-            yield
-            yield
-            yield
-            yield
-            yield
-            yield
-            yield
-            yield
-            yield
-            yield
-            yield
-            yield
+            # a sync process starts after the first edge, that is one cycle
+            for _ in range(args.cycles - 1):
+                yield
+            # twice like the profiler, so it sees the state after the last edge
+            yield Settle()
+            yield Settle()
+            if core.counters is not None:
+                totals, histogram = yield from core.counters.read()
+                for counter, value in totals.items():
+                    print(f"{counter.name.lower():<8} {value}")
+                retired = totals[Counter.RETIRED]
+                print(f"IPC      {retired / totals[Counter.CYCLES]:.3f}")
+                top = sorted(range(256), key=lambda op: -histogram[op])
+                for op in top[:8]:
+                    if histogram[op]:
+                        print(
+                            f"  {op:02X} {histogram[op]:>8} {histogram[op] / retired:6.1%}"
+                        )
 
         sim.add_sync_process(process, domain="sync")
-        with sim.write_vcd("test.vcd", "test.gtkw", traces=core.ports()):
-            sim.run()
+        tracer = None
+        if args.trace is not None:
+            # pyvcd is only needed when a trace is asked for
+            from waves import Tracer, select
+
+            signals = select(core, args.signals, sim)
+            tracer = Tracer(args.trace, signals, args.start, args.stop)
+            sim.add_process(tracer.process())
+        profiler = None
+        if args.profile is not None:
+            # the counters are read out after the run, keep those cycles out
+            profiler = Profiler(core, limit=args.cycles)
+            sim.add_process(profiler.process())
+        sim.run()
+        if tracer is not None:
+            tracer.close()
+        if profiler is not None:
+            profiler.report()
+            profiler.save(args.profile)
+        if args.dump is not None:
+            bus.save(args.dump)
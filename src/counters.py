@@ -0,0 +1,130 @@
+# counters.py: Performance counters of the core, read through a debug port
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+from enum import IntEnum
+from typing import Dict, Generator, List
+
+from nmigen import Elaboratable, Memory, Module, Mux, Signal
+from nmigen.build import Platform
+from nmigen.sim import Settle
+
+# debug port address of the histogram entry of opcode 0
+HISTOGRAM = 0x100
+
+
+class Counter(IntEnum):
+    """Debug port address of every total"""
+
+    CYCLES = 0
+    RETIRED = 1  # instructions, counted on the fetch of the next opcode
+    READS = 2
+    WRITES = 3
+    IDLE = 4  # cycles without a bus access
+
+
+class Counters(Elaboratable):
+    """Totals of the bus activity and a histogram of the opcodes fetched, so IPC
+    and the instruction mix can be read out of long runs without a waveform.
+
+    Reading addr gives its value on data the cycle after. Totals wrap around at
+    width bits. The histogram is a memory with a read, add, write pipeline, so it
+    maps to block RAM; freeze holds every count for a consistent readout."""
+
+    def __init__(self, width: int = 32, histogram: bool = True):
+        self.width = width
+        self.histogram = histogram
+
+        # from the core
+        self.start = Signal()  # cycle 1, the opcode is on opcode
+        self.opcode = Signal(8)
+        self.enable = Signal()
+        self.RWB = Signal()
+
+        # debug port
+        self.freeze = Signal()
+        self.addr = Signal(9)
+        self.data = Signal(width)
+
+        self.totals = {c: Signal(width, name=c.name.lower()) for c in Counter}
+        self.mem = Memory(width=width, depth=256) if histogram else None
+
+    def ports(self) -> List[Signal]:
+        return [self.freeze, self.addr, self.data]
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+
+        events = {
+            Counter.CYCLES: 1,
+            Counter.RETIRED: self.start,
+            Counter.READS: self.enable & self.RWB,
+            Counter.WRITES: self.enable & ~self.RWB,
+            Counter.IDLE: ~self.enable,
+        }
+        with m.If(~self.freeze):
+            for counter, event in events.items():
+                total = self.totals[counter]
+                m.d.sync += total.eq(total + event)
+
+        # totals read out one cycle late too, like the histogram
+        total = Signal(self.width)
+        with m.Switch(self.addr):
+            for counter, signal in self.totals.items():
+                with m.Case(counter):
+                    m.d.sync += total.eq(signal)
+        if not self.histogram:
+            m.d.comb += self.data.eq(total)
+            return m
+
+        m.submodules.count = count = self.mem.read_port(transparent=False)
+        m.submodules.debug = debug = self.mem.read_port(transparent=False)
+        m.submodules.write = write = self.mem.write_port()
+
+        # the entry read last cycle is written back incremented, unless the write
+        # of last cycle went to it, count has the value from before that write
+        pending = Signal()
+        opcode = Signal(8)
+        last = Signal(self.width)
+        last_addr = Signal(8)
+        last_en = Signal()
+        m.d.comb += [count.addr.eq(self.opcode), count.en.eq(1)]
+        m.d.sync += [
+            pending.eq(self.start & ~self.freeze),
+            opcode.eq(self.opcode),
+            last.eq(write.data),
+            last_addr.eq(write.addr),
+            last_en.eq(write.en),
+        ]
+        forward = last_en & (last_addr == opcode)
+        m.d.comb += [
+            write.addr.eq(opcode),
+            write.data.eq(Mux(forward, last, count.data) + 1),
+            write.en.eq(pending),
+        ]
+
+        table = Signal()
+        m.d.sync += table.eq(self.addr >= HISTOGRAM)
+        m.d.comb += [
+            debug.addr.eq(self.addr),
+            debug.en.eq(1),
+            self.data.eq(Mux(table, debug.data, total)),
+        ]
+
+        return m
+
+    def read(self) -> Generator:
+        """Simulator process body that freezes the counters and reads everything
+        out through the debug port, returns the totals and the histogram"""
+        yield self.freeze.eq(1)
+        addrs = list(Counter)
+        if self.histogram:
+            addrs += range(HISTOGRAM, HISTOGRAM + 256)
+        values = []
+        for addr in addrs:
+            yield self.addr.eq(addr)
+            yield
+            yield Settle()
+            values.append((yield self.data))
+        yield self.freeze.eq(0)
+        totals: Dict[Counter, int] = dict(zip(Counter, values))
+        return totals, values[len(Counter) :]
@@ -0,0 +1,185 @@
+# coverage.py: Implementation, formal and cycle count status of all 256 opcodes
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+import inspect
+import json
+import os
+import re
+from argparse import ArgumentParser
+from typing import Dict, List, NamedTuple, Optional
+
+from nmigen import Module
+from nmigen.sim import Settle, Simulator, Tick
+
+from bus import BusModel
+from core import Core
+from instruction import Instruction, implemented
+from verify import targets
+
+# a line of the tables in implemented.py, commented out until implemented
+ENTRY = re.compile(r"^\s*(#\s*)?([\w.]+)\s*,\s*#\s*([0-9A-Fnxy])([0-9A-F])\s*$")
+TABLE = re.compile(r"^(_\w+) = \[")
+
+# opcode columns of a table entry: any, even or odd high nibble
+NIBBLES = {"n": range(16), "x": range(0, 16, 2), "y": range(1, 16, 2)}
+
+# the comment above an instruction class, see the datasheet
+# MOV A, !abs   E5      3 4   N-----Z-  A <- (abs)
+DATASHEET = re.compile(r"#\s*(.+?)\s+([0-9A-F]{2})\s+(\d+)\s+(\d+)\s+([-A-Z]{8})")
+
+
+class Spec(NamedTuple):
+    table: str  # addressing mode list in implemented.py
+    name: str  # as written there, the module and class once implemented
+
+
+def spec() -> Dict[int, Spec]:
+    """Every opcode listed in implemented.py, implemented or not"""
+    opcodes = {}
+    table = ""
+    with open(implemented.__file__) as f:
+        for line in f:
+            found = TABLE.match(line)
+            if found:
+                table = found.group(1).lstrip("_")
+            found = ENTRY.match(line)
+            if found:
+                _, name, high, low = found.groups()
+                highs = NIBBLES[high] if high in NIBBLES else [int(high, 16)]
+                for h in highs:
+                    opcodes[h << 4 | int(low, 16)] = Spec(table, name.strip())
+    return opcodes
+
+
+def datasheet(instr: Instruction) -> Optional[Dict[str, int]]:
+    """Bytes and cycles from the comment above the class"""
+    found = DATASHEET.search(inspect.getcomments(instr) or "")
+    if found is None:
+        return None
+    return {"bytes": int(found.group(3)), "cycles": int(found.group(4))}
+
+
+def observed() -> List[int]:
+    """Cycles every opcode takes on the core, measured in a single simulation.
+    Each opcode is written where the next instruction is fetched from, followed by
+    the absolute address 0x8000, so jumps and accesses stay clear of the code"""
+    m = Module()
+    m.submodules.core = core = Core()
+    bus = BusModel()
+    mem = bus.mem
+    cycles: List[int] = []
+
+    def process():
+        opcode = -1
+        count = 0
+        while opcode < 256:
+            yield Settle()
+            addr = yield core.addr
+            if (yield core.cycle) == 1:
+                if opcode >= 0:
+                    cycles.append(count)
+                opcode += 1
+                count = 0
+                mem[addr] = opcode & 0xFF
+                mem[(addr + 1) & 0xFFFF] = 0x00
+                mem[(addr + 2) & 0xFFFF] = 0x80
+                # the bus may have answered from mem already this cycle
+                yield core.dout.eq(opcode & 0xFF)
+            count += 1
+            yield Tick()
+
+    sim = Simulator(m)
+    sim.add_clock(1e-6)
+    sim.add_process(bus.process(core))
+    sim.add_process(process)
+    sim.run()
+    return cycles
+
+
+def dashboard(directory: str) -> List[dict]:
+    try:
+        with open(os.path.join(directory, "results.json")) as f:
+            results = json.load(f)
+    except (OSError, ValueError):
+        results = {}
+    instrs = {i.opcode: i for i in implemented.implemented}
+    listed = spec()
+    cycles = observed()
+
+    rows = []
+    for opcode in range(256):
+        instr = instrs.get(opcode)
+        row = {
+            "opcode": f"{opcode:02X}",
+            "table": listed[opcode].table if opcode in listed else None,
+            "name": listed[opcode].name if opcode in listed else None,
+            "implemented": instr is not None,
+            "cycles": cycles[opcode],
+            "datasheet": None,
+            "status": None,  # PASS only once every variant passed
+            "time": None,  # seconds of the last proofs, all variants
+            "proofs": {},
+        }
+        if instr is not None:
+            row["datasheet"] = datasheet(instr)
+            name = implemented.name(instr)
+            proofs = {
+                str(t): results[str(t)]
+                for t in targets()
+                if t.top == "core" and t.name == name and str(t) in results
+            }
+            statuses = {p["status"] for p in proofs.values()}
+            row["proofs"] = proofs
+            if proofs:
+                row["status"] = "PASS" if statuses == {"PASS"} else "FAIL"
+                row["time"] = sum(p["time"] for p in proofs.values())
+        rows.append(row)
+    return rows
+
+
+def summary(rows: List[dict], slowest: int = 10):
+    done = [r for r in rows if r["implemented"]]
+    passed = [r for r in done if r["status"] == "PASS"]
+    failed = [r for r in done if r["status"] == "FAIL"]
+    unproven = [r for r in done if r["status"] is None]
+    unlisted = [r for r in rows if r["table"] is None]
+    print(f"{len(done)}/256 opcodes implemented, {len(unlisted)} not in the tables")
+    print(f"{len(passed)} pass, {len(failed)} fail, {len(unproven)} without a proof")
+    for r in failed:
+        print(f"  FAIL {r['opcode']} {r['name']}")
+
+    print("cycles against the datasheet")
+    for r in done:
+        expected = r["datasheet"]["cycles"] if r["datasheet"] else "?"
+        mark = "" if expected == r["cycles"] else "  <- differs"
+        print(f"  {r['opcode']} {r['name']:<24} {r['cycles']:>3} {expected:>3}{mark}")
+
+    timed = sorted((r for r in done if r["time"]), key=lambda r: -r["time"])
+    total = sum(r["time"] for r in timed)
+    print(f"proof time {total:.2f}s, slowest")
+    for r in timed[:slowest]:
+        share = r["time"] / total if total else 0
+        print(f"  {r['opcode']} {r['name']:<24} {r['time']:8.2f}s {share:6.1%}")
+
+    tables: Dict[str, List[int]] = {}
+    for r in rows:
+        if r["table"] is not None:
+            count = tables.setdefault(r["table"], [0, 0])
+            count[0] += r["implemented"]
+            count[1] += 1
+    print("implemented per table")
+    for table, (n, total) in sorted(tables.items()):
+        print(f"  {table:<28} {n:>3}/{total}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="status of every opcode")
+    parser.add_argument("--dir", default="formal", help="verify.py working directory")
+    parser.add_argument("-o", "--output", default="coverage.json")
+    parser.add_argument("--slowest", type=int, default=10)
+    args = parser.parse_args()
+
+    rows = dashboard(os.path.abspath(args.dir))
+    with open(args.output, "w") as f:
+        json.dump(rows, f, indent=2)
+    summary(rows, args.slowest)
@@ -0,0 +1,254 @@
+# cxxsim.py: Compiled CXXRTL simulator with the process API of nmigen.sim
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+import ctypes
+import os
+import subprocess
+from hashlib import sha256
+from typing import Callable, Dict, Generator, List, Optional, Tuple
+
+from nmigen import Const, Fragment, Signal, Value
+from nmigen.back import rtlil
+from nmigen.hdl.ast import Assign, SignalDict
+from nmigen.sim import Passive, Settle, Tick
+
+YOSYS = os.environ.get("YOSYS", "yosys")
+CXX = os.environ.get("CXX", "c++")
+CXXFLAGS = os.environ.get("CXXFLAGS", "-O2").split()
+
+# Reading and writing objects from Python needs the struct layout of
+# cxxrtl_object, which changes across yosys versions. Let the compiler handle it.
+_SHIM = """
+#include <cstdint>
+#include <{header}>
+
+extern "C" {{
+
+cxxrtl_object *shim_get(cxxrtl_handle handle, const char *name) {{
+    return cxxrtl_get(handle, name);
+}}
+
+uint64_t shim_read(cxxrtl_object *object, size_t index) {{
+#ifdef SHIM_OUTLINE
+    if (object->outline)
+        cxxrtl_outline_eval(object->outline);
+#endif
+    size_t chunks = (object->width + 31) / 32;
+    uint32_t *data = object->curr + index * chunks;
+    uint64_t value = data[0];
+    if (chunks > 1)
+        value |= (uint64_t)data[1] << 32;
+    return value;
+}}
+
+void shim_write(cxxrtl_object *object, size_t index, uint64_t value) {{
+    size_t chunks = (object->width + 31) / 32;
+    uint32_t *data = (object->next ? object->next : object->curr) + index * chunks;
+    data[0] = (uint32_t)value;
+    if (chunks > 1)
+        data[1] = (uint32_t)(value >> 32);
+}}
+
+void shim_run(cxxrtl_handle handle, cxxrtl_object *clk, uint64_t cycles) {{
+    for (uint64_t i = 0; i < cycles; i++) {{
+        shim_write(clk, 0, 0);
+        cxxrtl_step(handle);
+        shim_write(clk, 0, 1);
+        cxxrtl_step(handle);
+    }}
+}}
+
+}}
+"""
+
+
+def datdir() -> str:
+    if "YOSYS_DATDIR" in os.environ:
+        return os.environ["YOSYS_DATDIR"]
+    proc = subprocess.run(
+        [f"{YOSYS}-config", "--datdir"], capture_output=True, text=True, check=True
+    )
+    return proc.stdout.strip()
+
+
+def build(fragment: Fragment, directory: str) -> Tuple[str, Dict[Signal, str]]:
+    """Compile the design into a shared library, reusing an earlier build of the
+    same C++. Returns its path and the CXXRTL name of every signal."""
+    il, name_map = rtlil.convert_fragment(fragment)
+    names = SignalDict(
+        (signal, " ".join(name[1:])) for signal, name in name_map.items()
+    )
+
+    digest = sha256((il + " ".join(CXXFLAGS)).encode()).hexdigest()[:16]
+    workdir = os.path.join(directory, digest)
+    library = os.path.join(workdir, "design.so")
+    if os.path.exists(library):
+        return library, names
+
+    os.makedirs(workdir, exist_ok=True)
+    with open(os.path.join(workdir, "design.il"), "w") as f:
+        f.write(il)
+    subprocess.run(
+        [YOSYS, "-q", "-p", "read_rtlil design.il; write_cxxrtl design.cc"],
+        cwd=workdir,
+        check=True,
+    )
+    with open(os.path.join(workdir, "design.cc")) as f:
+        cxx = f.read()
+
+    include = os.path.join(datdir(), "include")
+    runtime = os.path.join(include, "backends", "cxxrtl", "runtime")
+    if os.path.isdir(runtime):
+        include = runtime
+        header = "cxxrtl/capi/cxxrtl_capi.h"
+    else:
+        header = "backends/cxxrtl/cxxrtl_capi.h"
+    sources = ["design.cc", "shim.cc"]
+    defines = []
+    if "CXXRTL_INCLUDE_CAPI_IMPL" in cxx:
+        defines.append("-DCXXRTL_INCLUDE_CAPI_IMPL")
+    else:
+        sources.append(os.path.join(include, header[:-1] + "cc"))
+    with open(os.path.join(include, header)) as f:
+        if "outline" in f.read():
+            defines.append("-DSHIM_OUTLINE")
+
+    with open(os.path.join(workdir, "shim.cc"), "w") as f:
+        f.write(_SHIM.format(header=header))
+    subprocess.run(
+        [CXX, *CXXFLAGS, *defines, "-shared", "-fPIC", "-I", include]
+        + sources
+        + ["-o", "design.so.tmp"],
+        cwd=workdir,
+        check=True,
+    )
+    os.replace(library + ".tmp", library)
+    return library, names
+
+
+class CxxSimulator:
+    """Drop in for nmigen.sim.Simulator on a single clock domain.
+
+    Processes may yield signals to read them, .eq() of constants to write them,
+    Tick() to wait for the next clock edge and Settle(). Every value is settled
+    after a clock edge, as if Settle() had been yielded."""
+
+    def __init__(self, fragment, directory: str = "build/cxxsim"):
+        self.fragment = Fragment.get(fragment, platform=None).prepare()
+        library, self.names = build(self.fragment, directory)
+
+        self.lib = lib = ctypes.CDLL(library)
+        lib.cxxrtl_design_create.restype = ctypes.c_void_p
+        lib.cxxrtl_create.restype = ctypes.c_void_p
+        lib.cxxrtl_create.argtypes = [ctypes.c_void_p]
+        lib.cxxrtl_destroy.argtypes = [ctypes.c_void_p]
+        lib.cxxrtl_step.argtypes = [ctypes.c_void_p]
+        lib.shim_get.restype = ctypes.c_void_p
+        lib.shim_get.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+        lib.shim_read.restype = ctypes.c_uint64
+        lib.shim_read.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        lib.shim_write.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint64]
+        lib.shim_run.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint64]
+
+        self.handle = lib.cxxrtl_create(lib.cxxrtl_design_create())
+        self.objects: Dict[Signal, int] = SignalDict()
+        self.clk: Optional[int] = None
+        self.period = 0.0
+        self.cycles = 0
+        self.processes: List[Generator] = []
+        self.passive: List[Generator] = []
+
+    def __del__(self):
+        if getattr(self, "handle", None):
+            self.lib.cxxrtl_destroy(self.handle)
+
+    def _object(self, signal: Signal) -> int:
+        if signal not in self.objects:
+            name = self.names.get(signal)
+            obj = self.lib.shim_get(self.handle, name.encode()) if name else None
+            if not obj:
+                raise KeyError(f"{signal!r} is not visible in the compiled design")
+            self.objects[signal] = obj
+        return self.objects[signal]
+
+    def visible(self, signal: Signal) -> bool:
+        """Whether the signal is still there after the CXXRTL build"""
+        try:
+            self._object(signal)
+        except KeyError:
+            return False
+        return True
+
+    def read(self, signal: Signal) -> int:
+        value = self.lib.shim_read(self._object(signal), 0)
+        return Const(value, signal.shape()).value
+
+    def write(self, signal: Signal, value: int):
+        self.lib.shim_write(self._object(signal), 0, value & ((1 << len(signal)) - 1))
+        self.lib.cxxrtl_step(self.handle)
+
+    def add_clock(self, period: float, *, domain: str = "sync"):
+        name = "clk" if domain == "sync" else f"{domain}_clk"
+        self.clk = self.lib.shim_get(self.handle, name.encode())
+        self.period = period
+
+    def add_process(self, process: Callable[[], Generator]):
+        self.processes.append(process())
+
+    def add_sync_process(self, process: Callable[[], Generator], *, domain="sync"):
+        def wrapper():
+            yield Tick(domain)
+            yield from process()
+
+        self.add_process(wrapper)
+
+    def _advance(self, process: Generator) -> bool:
+        """Run a process up to its next Tick, return False once it is done"""
+        response = None
+        while True:
+            try:
+                command = process.send(response)
+            except StopIteration:
+                return False
+            response = None
+            if command is None or isinstance(command, Tick):
+                return True
+            elif isinstance(command, Settle):
+                pass
+            elif isinstance(command, Passive):
+                self.passive.append(process)
+            elif isinstance(command, Assign):
+                self.write(command.lhs, Const.cast(command.rhs).value)
+            elif isinstance(command, Signal):
+                response = self.read(command)
+            elif isinstance(command, Value):
+                raise TypeError(f"only signals can be read, not {command!r}")
+            else:
+                raise TypeError(f"unsupported command {command!r}")
+
+    def step(self, cycles: int = 1):
+        self.lib.shim_run(self.handle, self.clk, cycles)
+        self.cycles += cycles
+
+    def _active(self) -> bool:
+        return any(p not in self.passive for p in self.processes)
+
+    def run(self):
+        """Run until every process that is not passive has returned"""
+        self.processes = [p for p in self.processes if self._advance(p)]
+        while self._active():
+            self.step()
+            self.processes = [p for p in self.processes if self._advance(p)]
+
+    def run_until(self, deadline: float, *, run_passive: bool = False):
+        """Run for deadline seconds of simulated time, or until every process has
+        returned unless run_passive is set"""
+        end = round(deadline / self.period)
+        self.processes = [p for p in self.processes if self._advance(p)]
+        while self.processes and self.cycles < end:
+            if not run_passive and not self._active():
+                return
+            self.step()
+            self.processes = [p for p in self.processes if self._advance(p)]
+        if run_passive and self.cycles < end:
+            self.step(end - self.cycles)
@@ -0,0 +1,143 @@
+# deps.py: Source files every formal target depends on, for incremental runs
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+import ast
+import json
+import os
+from hashlib import sha256
+from typing import Dict, List, Optional, Set
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+
+# only lists the instructions, a check elaborates just its own, see Core
+IMPLEMENTED = os.path.join("instruction", "implemented.py")
+
+# all a check may be generated from, the HDL and its sby config. Simulation and
+# tooling modules would mark every proof stale whenever they change
+HDL = {
+    "core.py",
+    "alu.py",
+    "microcode.py",
+    "pc.py",
+    "registers.py",
+    "snapshot.py",
+    "sby.py",
+}
+
+
+def module_file(name: str) -> Optional[str]:
+    """Path relative to SRC of a module in the tree, None for anything else"""
+    path = os.path.join(*name.split("."))
+    for candidate in [f"{path}.py", os.path.join(path, "__init__.py")]:
+        if os.path.exists(os.path.join(SRC, candidate)):
+            return candidate
+    return None
+
+
+def runner(node: ast.AST) -> bool:
+    """An if __name__ == "__main__" or if TYPE_CHECKING block, nothing it imports
+    is part of an elaborated design"""
+    if not isinstance(node, ast.If):
+        return False
+    test = node.test
+    if isinstance(test, ast.Name):
+        return test.id == "TYPE_CHECKING"
+    return (
+        isinstance(test, ast.Compare)
+        and isinstance(test.left, ast.Name)
+        and test.left.id == "__name__"
+    )
+
+
+def imports(path: str) -> Set[str]:
+    """Files in the tree that the file imports, including the packages"""
+    with open(os.path.join(SRC, path)) as f:
+        tree = ast.parse(f.read(), path)
+    package = os.path.dirname(path).replace(os.sep, ".")
+
+    names = []
+    todo: List[ast.AST] = [tree]
+    while todo:
+        node = todo.pop()
+        if runner(node):
+            todo += node.orelse
+            continue
+        todo += ast.iter_child_nodes(node)
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                base = ".".join(filter(None, [package, base]))
+            # the imported names may be modules too
+            names += [base] + [f"{base}.{alias.name}" for alias in node.names]
+
+    found = set()
+    for name in names:
+        parts = name.split(".")
+        for n in range(1, len(parts) + 1):
+            file = module_file(".".join(parts[:n]))
+            if file is not None:
+                found.add(file)
+    found.discard(path)
+    return found
+
+
+def closure(roots: List[str], leaves: Set[str] = frozenset()) -> Set[str]:
+    """The roots and everything they import, the imports of leaves are not followed"""
+    seen: Set[str] = set()
+    todo = list(roots)
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        if path not in leaves:
+            todo += imports(path)
+    return seen
+
+
+def sources(top: str, name: str) -> Set[str]:
+    """Files the check of an instruction or ALU operation is generated from. An
+    instruction needs the core without the other instructions, and its module"""
+    if top == "core":
+        module = os.path.join("instruction", f"{name.split('.')[0]}.py")
+        return closure(["core.py", "sby.py", module], {IMPLEMENTED})
+    return closure(["alu.py", "sby.py"], {IMPLEMENTED})
+
+
+def strays(files: Set[str]) -> Set[str]:
+    """The sources of a check that are not HDL"""
+    return {f for f in files if f not in HDL and os.path.dirname(f) != "instruction"}
+
+
+def digest(files: Set[str]) -> str:
+    h = sha256()
+    for path in sorted(files):
+        h.update(path.encode() + b"\0")
+        with open(os.path.join(SRC, path), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class Green:
+    """Digest of the sources of every target as of its last PASS"""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.passed: Dict[str, str] = json.load(f)
+        except (OSError, ValueError):
+            self.passed = {}
+
+    def changed(self, target: str, files: Set[str]) -> bool:
+        return self.passed.get(target) != digest(files)
+
+    def record(self, target: str, files: Set[str]):
+        self.passed[target] = digest(files)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.passed, f, indent=2, sort_keys=True)
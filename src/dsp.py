@@ -0,0 +1,727 @@
+# dsp.py: S-DSP, eight BRR voices mixed to 32 kHz stereo, and its benchmark
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+import wave
+from argparse import ArgumentParser
+from array import array
+from enum import IntEnum
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+from nmigen import Cat, Const, Elaboratable, Memory, Module, Mux, Signal, Value, signed
+from nmigen.build import Platform
+from nmigen.hdl.rec import Record
+from nmigen.sim import Simulator
+
+from aram import ARAM
+from cxxsim import CxxSimulator
+
+STEPS = 16  # clock cycles spent on every voice
+CLOCK = 4_096_000  # four times the CPU clock, 8 * STEPS cycles per sample
+RATE = CLOCK // (8 * STEPS)  # 32 kHz
+
+
+class Reg(IntEnum):
+    """Register addresses, those of voice n are 0x10 * n further"""
+
+    VOLL = 0x00
+    VOLR = 0x01
+    PITCHL = 0x02
+    PITCHH = 0x03
+    SRCN = 0x04
+    ADSR1 = 0x05
+    ADSR2 = 0x06
+    GAIN = 0x07
+    ENVX = 0x08
+    OUTX = 0x09
+    MVOLL = 0x0C
+    MVOLR = 0x1C
+    EVOLL = 0x2C
+    EVOLR = 0x3C
+    KON = 0x4C
+    KOFF = 0x5C
+    FLG = 0x6C
+    ENDX = 0x7C
+    EFB = 0x0D
+    PMON = 0x2D
+    NON = 0x3D
+    EON = 0x4D
+    DIR = 0x5D
+    ESA = 0x6D
+    EDL = 0x7D
+
+
+class Mode(IntEnum):
+    """Envelope state of a voice"""
+
+    RELEASE = 0
+    ATTACK = 1
+    DECAY = 2
+    SUSTAIN = 3
+
+
+# register read on every step of a voice, it arrives from the memory on that step
+VOICE_READS = {
+    0: Reg.SRCN,
+    1: Reg.PITCHL,
+    2: Reg.PITCHH,
+    3: Reg.ADSR1,
+    4: Reg.ADSR2,
+    5: Reg.GAIN,
+    6: Reg.VOLL,
+    7: Reg.VOLR,
+}
+# the global registers are read on the spare steps of one voice, once per sample
+GLOBALS = 6
+GLOBAL_READS = {
+    8: Reg.DIR,
+    9: Reg.KOFF,
+    10: Reg.NON,
+    11: Reg.PMON,
+    12: Reg.FLG,
+    13: Reg.MVOLL,
+    14: Reg.MVOLR,
+}
+
+# state every voice keeps from one sample to the next
+VOICE = [
+    ("interp", 15),  # position between samples, 0x1000 per sample
+    ("buf_pos", 4),  # oldest of the 12 decoded samples
+    ("brr_addr", 16),  # header of the BRR block
+    ("brr_offset", 4),  # next pair of data bytes in the block
+    ("p1", signed(16)),  # last two samples decoded, for the BRR filters
+    ("p2", signed(16)),
+    ("env", 11),
+    ("hidden", signed(13)),  # envelope before clamping
+    ("mode", Mode),
+    ("kon_delay", 3),  # samples left until the voice starts after KON
+]
+
+# offsets of the global counter, per period factor, see period
+OFFSETS = {1: 0, 3: 1040, 5: 536}
+COUNTER = 0x7800  # samples until the global counter wraps around
+
+
+def period(rate: int) -> Optional[Tuple[int, int]]:
+    """Envelope and noise rates fire every factor << shift samples, factor is 1, 3
+    or 5. Rate 0 never fires"""
+    if rate == 0:
+        return None
+    if rate >= 30:
+        return 1, 31 - rate
+    group, factor = divmod(rate - 1, 3)
+    return [(1, 11 - group), (3, 9 - group), (5, 8 - group)][factor]
+
+
+# fmt: off
+GAUSS = [
+       0,   0,   0,   0,   0,   0,   0,   0,   0,   0,   0,   0,   0,   0,   0,   0,
+       1,   1,   1,   1,   1,   1,   1,   1,   1,   1,   1,   2,   2,   2,   2,   2,
+       2,   2,   3,   3,   3,   3,   3,   4,   4,   4,   4,   4,   5,   5,   5,   5,
+       6,   6,   6,   6,   7,   7,   7,   8,   8,   8,   9,   9,   9,  10,  10,  10,
+      11,  11,  11,  12,  12,  13,  13,  14,  14,  15,  15,  15,  16,  16,  17,  17,
+      18,  19,  19,  20,  20,  21,  21,  22,  23,  23,  24,  24,  25,  26,  27,  27,
+      28,  29,  29,  30,  31,  32,  32,  33,  34,  35,  36,  36,  37,  38,  39,  40,
+      41,  42,  43,  44,  45,  46,  47,  48,  49,  50,  51,  52,  53,  54,  55,  56,
+      58,  59,  60,  61,  62,  64,  65,  66,  67,  69,  70,  71,  73,  74,  76,  77,
+      78,  80,  81,  83,  84,  86,  87,  89,  90,  92,  94,  95,  97,  99, 100, 102,
+     104, 106, 107, 109, 111, 113, 115, 117, 118, 120, 122, 124, 126, 128, 130, 132,
+     134, 137, 139, 141, 143, 145, 147, 150, 152, 154, 156, 159, 161, 163, 166, 168,
+     171, 173, 175, 178, 180, 183, 186, 188, 191, 193, 196, 199, 201, 204, 207, 210,
+     212, 215, 218, 221, 224, 227, 230, 233, 236, 239, 242, 245, 248, 251, 254, 257,
+     260, 263, 267, 270, 273, 276, 280, 283, 286, 290, 293, 297, 300, 304, 307, 311,
+     314, 318, 321, 325, 328, 332, 336, 339, 343, 347, 351, 354, 358, 362, 366, 370,
+     374, 378, 381, 385, 389, 393, 397, 401, 405, 410, 414, 418, 422, 426, 430, 434,
+     439, 443, 447, 451, 456, 460, 464, 469, 473, 477, 482, 486, 491, 495, 499, 504,
+     508, 513, 517, 522, 527, 531, 536, 540, 545, 550, 554, 559, 563, 568, 573, 577,
+     582, 587, 592, 596, 601, 606, 611, 615, 620, 625, 630, 635, 640, 644, 649, 654,
+     659, 664, 669, 674, 678, 683, 688, 693, 698, 703, 708, 713, 718, 723, 728, 732,
+     737, 742, 747, 752, 757, 762, 767, 772, 777, 782, 787, 792, 797, 802, 806, 811,
+     816, 821, 826, 831, 836, 841, 846, 851, 855, 860, 865, 870, 875, 880, 884, 889,
+     894, 899, 904, 908, 913, 918, 923, 927, 932, 937, 941, 946, 951, 955, 960, 965,
+     969, 974, 978, 983, 988, 992, 997,1001,1005,1010,1014,1019,1023,1027,1032,1036,
+    1040,1045,1049,1053,1057,1061,1066,1070,1074,1078,1082,1086,1090,1094,1098,1102,
+    1106,1109,1113,1117,1121,1125,1128,1132,1136,1139,1143,1146,1150,1153,1157,1160,
+    1164,1167,1170,1174,1177,1180,1183,1186,1190,1193,1196,1199,1202,1205,1207,1210,
+    1213,1216,1219,1221,1224,1227,1229,1232,1234,1237,1239,1241,1244,1246,1248,1251,
+    1253,1255,1257,1259,1261,1263,1265,1267,1269,1270,1272,1274,1275,1277,1279,1280,
+    1282,1283,1284,1286,1287,1288,1290,1291,1292,1293,1294,1295,1296,1297,1297,1298,
+    1299,1300,1300,1301,1302,1302,1303,1303,1303,1304,1304,1304,1304,1304,1305,1305,
+]
+# fmt: on
+
+
+def gauss() -> List[int]:
+    """Interpolation kernel, entry n weighs the sample 2 - n / 256 samples away.
+    The gaussian ROM of the S-DSP, every four taps add up to about 2048"""
+    return list(GAUSS)
+
+
+def clamp16(value: Value) -> Value:
+    return Mux(value > 0x7FFF, 0x7FFF, Mux(value < -0x8000, -0x8000, value))
+
+
+class DSP(Elaboratable):
+    """The S-DSP without echo. Voices take turns on one multiplier, BRR decoder
+    and envelope unit, STEPS cycles each, so a stereo sample comes out every
+    8 * STEPS cycles. Samples are read from ARAM through addr and data, answered in
+    the same cycle like the bus of the core.
+
+    The CPU side reads and writes registers through reg_addr, reg_dout is valid
+    the cycle after. left and right hold a sample from the cycle valid is high."""
+
+    def __init__(self, regs: bytes = b""):
+        if len(regs) > 128:
+            raise ValueError(f"the DSP has 128 registers, got {len(regs)} bytes")
+        regs = bytes(regs).ljust(128, b"\0")
+        self.init = regs
+
+        # ARAM, read only
+        self.addr = Signal(16)
+        self.data = Signal(8)
+
+        # registers, from the CPU
+        self.reg_addr = Signal(7)
+        self.reg_din = Signal(8)
+        self.reg_we = Signal()
+        self.reg_dout = Signal(8)
+
+        self.left = Signal(signed(16))
+        self.right = Signal(signed(16))
+        self.valid = Signal()
+
+        self.regs = Memory(width=8, depth=128, init=regs)
+
+    def ports(self) -> List[Signal]:
+        return [
+            self.addr,
+            self.data,
+            self.reg_addr,
+            self.reg_din,
+            self.reg_we,
+            self.reg_dout,
+            self.left,
+            self.right,
+            self.valid,
+        ]
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+
+        slot = Signal(7)
+        m.d.sync += slot.eq(slot + 1)
+        voice = slot[4:]
+        step = slot[:4]
+        upcoming = Signal(7)
+        m.d.comb += upcoming.eq(slot + 1)
+        vbit = Signal(8)
+        m.d.comb += vbit.eq(1 << voice)
+        last = voice == 7
+
+        w = Record(VOICE)
+        state = Memory(width=len(w), depth=8)
+        buf = Memory(width=16, depth=128)  # 12 decoded samples of every voice
+        rom = Memory(width=11, depth=512, init=gauss())
+        status = Memory(width=8, depth=16)  # ENVX and OUTX of every voice
+        m.submodules.reg_read = reg_read = self.regs.read_port(transparent=False)
+        m.submodules.reg_cpu = reg_cpu = self.regs.read_port(transparent=False)
+        m.submodules.reg_write = reg_write = self.regs.write_port()
+        m.submodules.state_read = state_read = state.read_port(transparent=False)
+        m.submodules.state_write = state_write = state.write_port()
+        m.submodules.buf_read = buf_read = buf.read_port(transparent=False)
+        m.submodules.buf_write = buf_write = buf.write_port()
+        m.submodules.gauss = weight = rom.read_port(transparent=False)
+        m.submodules.status_read = status_read = status.read_port(transparent=False)
+        m.submodules.status_write = status_write = status.write_port()
+        for port in [reg_read, reg_cpu, state_read, buf_read, weight, status_read]:
+            m.d.comb += port.en.eq(1)
+
+        """Registers, read a cycle ahead of the step that needs them"""
+        with m.Switch(upcoming[:4]):
+            for s, reg in VOICE_READS.items():
+                with m.Case(s):
+                    m.d.comb += reg_read.addr.eq(Cat(Const(reg, 4), upcoming[4:]))
+        with m.If(upcoming[4:] == GLOBALS):
+            with m.Switch(upcoming[:4]):
+                for s, reg in GLOBAL_READS.items():
+                    with m.Case(s):
+                        m.d.comb += reg_read.addr.eq(reg)
+        data = reg_read.data
+
+        glob = {
+            reg: Signal(8, name=reg.name.lower(), reset=self.init[reg])
+            for reg in GLOBAL_READS.values()
+        }
+        with m.If(voice == GLOBALS):
+            with m.Switch(step):
+                for s, reg in GLOBAL_READS.items():
+                    with m.Case(s):
+                        m.d.sync += glob[reg].eq(data)
+        flg = glob[Reg.FLG]
+
+        srcn = Signal(8)
+        pitch = Signal(16)
+        adsr1 = Signal(8)
+        adsr2 = Signal(8)
+        gain = Signal(8)
+        voll = Signal(signed(8))
+        volr = Signal(signed(8))
+
+        # latched for every voice every other sample, KON bits once per write
+        new_kon = Signal(8, reset=self.init[Reg.KON])
+        kon = Signal(8)
+        koff = Signal(8)
+        every_other = Signal()
+        endx = Signal(8, reset=self.init[Reg.ENDX])
+
+        noise = Signal(15, reset=0x4000)
+        counter = Signal(range(COUNTER), reset=0)
+        residues = {
+            factor: Signal(range(factor), name=f"mod{factor}", reset=offset % factor)
+            for factor, offset in OFFSETS.items()
+            if factor > 1
+        }
+
+        """The one multiplier, 17 x 17 bits"""
+        mul_a = Signal(signed(17))
+        mul_b = Signal(signed(17))
+        product = Signal(signed(34))
+        m.d.comb += product.eq(mul_a * mul_b)
+
+        prev = Signal(signed(16))  # output of the last voice, for pitch modulation
+        acc = Signal(signed(18))
+        out = Signal(signed(16))
+        main_l = Signal(signed(16))
+        main_r = Signal(signed(16))
+        with m.Switch(step):
+            with m.Case(3):
+                m.d.comb += [mul_a.eq(prev >> 5), mul_b.eq(pitch)]
+            with m.Case(5, 6, 7, 8):
+                m.d.comb += [mul_a.eq(buf_read.data.as_signed()), mul_b.eq(weight.data)]
+            with m.Case(9):
+                m.d.comb += [mul_a.eq(out), mul_b.eq(w.env)]
+            with m.Case(10):
+                m.d.comb += [mul_a.eq(prev), mul_b.eq(voll)]
+            with m.Case(11):
+                m.d.comb += [mul_a.eq(prev), mul_b.eq(volr)]
+            with m.Case(12):
+                m.d.comb += [mul_a.eq(main_l), mul_b.eq(glob[Reg.MVOLL].as_signed())]
+            with m.Case(13):
+                m.d.comb += [mul_a.eq(main_r), mul_b.eq(glob[Reg.MVOLR].as_signed())]
+
+        """Counter that paces envelopes and noise, see period"""
+        rate = Signal(5)
+        fire = Signal()
+        with m.Switch(Mux(step == 14, flg[:5], rate)):
+            for r in range(32):
+                with m.Case(r):
+                    if period(r) is None:
+                        m.d.comb += fire.eq(0)
+                        continue
+                    factor, shift = period(r)
+                    aligned = Const(1)
+                    if shift > 0:
+                        aligned = (counter + OFFSETS[factor])[:shift] == 0
+                    if factor > 1:
+                        aligned &= residues[factor] == 0
+                    m.d.comb += fire.eq(aligned)
+
+        """BRR decoder, one sample per cycle from a nibble"""
+        header = Signal(8)
+        byte_a = Signal(8)
+        byte_b = Signal(8)
+        nibble = Signal(4)
+        nibbles = {7: byte_a[4:], 8: byte_a[:4], 9: byte_b[4:], 10: byte_b[:4]}
+        with m.Switch(step):
+            for s, value in nibbles.items():
+                with m.Case(s):
+                    m.d.comb += nibble.eq(value)
+        shift = header[4:]
+        base = Signal(signed(20))
+        with m.If(shift >= 13):
+            m.d.comb += base.eq(Mux(nibble[3], -2048, 0))
+        with m.Else():
+            m.d.comb += base.eq((nibble.as_signed() << shift) >> 1)
+        p1 = w.p1
+        p2 = Signal(signed(15))
+        m.d.comb += p2.eq(w.p2 >> 1)
+        # the constant products as shifts and adds, the multiplier is shared
+        p1x3 = p1 + (p1 << 1)
+        p1x13 = p1x3 + (p1 << 3) + (p1 << 1)
+        p2x3 = p2 + (p2 << 1)
+        filtered = Signal(signed(20))
+        with m.Switch(header[2:4]):
+            with m.Case(0):
+                m.d.comb += filtered.eq(base)
+            with m.Case(1):
+                m.d.comb += filtered.eq(base + (p1 >> 1) + ((-p1) >> 5))
+            with m.Case(2):
+                m.d.comb += filtered.eq(base + p1 - p2 + (p2 >> 4) + ((-p1x3) >> 6))
+            with m.Case(3):
+                m.d.comb += filtered.eq(base + p1 - p2 + ((-p1x13) >> 7) + (p2x3 >> 4))
+        decoded = Signal(signed(16))  # wraps around
+        m.d.comb += decoded.eq(clamp16(filtered) << 1)
+        decoding = w.interp[14]  # 4 more samples needed
+
+        """Envelope of the next sample"""
+        env = Signal(signed(12))
+        m.d.comb += env.eq(w.env)
+        decrement = Signal(signed(13))
+        m.d.comb += decrement.eq(env - 1)
+        decayed = decrement - (decrement >> 8)
+        target = Signal(signed(14))
+        sustain = Signal(3)
+        with m.If(adsr1[7]):
+            m.d.comb += sustain.eq(adsr2[5:])
+            with m.If(w.mode == Mode.ATTACK):
+                m.d.comb += [
+                    rate.eq(Cat(1, adsr1[:4])),
+                    target.eq(env + Mux(adsr1[:4] == 0xF, 0x400, 0x20)),
+                ]
+            with m.Else():
+                m.d.comb += target.eq(decayed)
+                with m.If(w.mode == Mode.DECAY):
+                    m.d.comb += rate.eq(Cat(0, adsr1[4:7], 1))
+                with m.Else():
+                    m.d.comb += rate.eq(adsr2[:5])
+        with m.Else():
+            m.d.comb += sustain.eq(gain[5:])
+            with m.If(~gain[7]):  # direct
+                m.d.comb += [rate.eq(31), target.eq(gain[:7] << 4)]
+            with m.Else():
+                m.d.comb += rate.eq(gain[:5])
+                with m.Switch(gain[5:7]):
+                    with m.Case(0):  # linear decrease
+                        m.d.comb += target.eq(env - 0x20)
+                    with m.Case(1):  # exponential decrease
+                        m.d.comb += target.eq(decayed)
+                    with m.Case(2):  # linear increase
+                        m.d.comb += target.eq(env + 0x20)
+                    with m.Case(3):  # bent line increase
+                        bent = (w.hidden < 0) | (w.hidden >= 0x600)
+                        m.d.comb += target.eq(env + Mux(bent, 0x8, 0x20))
+
+        """ARAM, directory entries and BRR blocks"""
+        entry = Signal(16)
+        m.d.comb += entry.eq((glob[Reg.DIR] << 8) + (srcn << 2))
+        starting = w.kon_delay == 5
+        loop = Signal(16)  # or start address, from the directory
+        block = Signal(16)
+        m.d.comb += block.eq(w.brr_addr + w.brr_offset)
+        with m.Switch(step):
+            with m.Case(2):
+                m.d.comb += self.addr.eq(entry + Mux(starting, 0, 2))
+            with m.Case(3):
+                m.d.comb += self.addr.eq(entry + Mux(starting, 1, 3))
+            with m.Case(4):
+                m.d.comb += self.addr.eq(w.brr_addr)
+            with m.Case(5):
+                m.d.comb += self.addr.eq(block)
+            with m.Case(6):
+                m.d.comb += self.addr.eq(block + 1)
+
+        """The 4 samples around the position, oldest first, and their weights"""
+        tap = Signal(2)
+        m.d.comb += tap.eq(step - 4)
+        index = Signal(5)
+        m.d.comb += index.eq(w.buf_pos + w.interp[12:] + tap)
+        m.d.comb += buf_read.addr.eq(
+            Cat(Mux(index >= 12, index - 12, index)[:4], voice)
+        )
+        fraction = w.interp[4:12]
+        with m.Switch(tap):
+            with m.Case(0):
+                m.d.comb += weight.addr.eq(Cat(~fraction, 0))
+            with m.Case(1):
+                m.d.comb += weight.addr.eq(Cat(~fraction, 1))
+            with m.Case(2):
+                m.d.comb += weight.addr.eq(Cat(fraction, 1))
+            with m.Case(3):
+                m.d.comb += weight.addr.eq(Cat(fraction, 0))
+
+        m.d.comb += [
+            state_read.addr.eq(upcoming[4:]),
+            state_write.addr.eq(voice),
+            state_write.data.eq(w),
+            buf_write.addr.eq(Cat((w.buf_pos + step - 7)[:4], voice)),
+            buf_write.data.eq(decoded),
+            status_write.addr.eq(Cat(step == 10, voice)),
+        ]
+
+        """The steps of a voice"""
+        pitched = Signal(17)
+        m.d.comb += pitched.eq(w.interp[:14] + pitch)
+        pitch_lo = Signal(8)
+        with m.Switch(step):
+            with m.Case(0):
+                m.d.sync += [w.eq(state_read.data), srcn.eq(data)]
+
+            with m.Case(1):
+                m.d.sync += pitch_lo.eq(data)
+                with m.If((kon & vbit).any()):
+                    m.d.sync += [
+                        w.kon_delay.eq(5),
+                        w.mode.eq(Mode.ATTACK),
+                        endx.eq(endx & ~vbit),
+                    ]
+                with m.Elif((koff & vbit).any()):
+                    m.d.sync += w.mode.eq(Mode.RELEASE)
+
+            with m.Case(2):
+                m.d.sync += [pitch.eq(Cat(pitch_lo, data[:6])), loop[:8].eq(self.data)]
+
+            with m.Case(3):
+                m.d.sync += [adsr1.eq(data), loop[8:].eq(self.data)]
+                with m.If((glob[Reg.PMON] & vbit & 0xFE).any()):
+                    m.d.sync += pitch.eq(pitch + (product >> 10))
+                with m.If(w.kon_delay != 0):
+                    with m.If(starting):
+                        m.d.sync += [
+                            w.brr_addr.eq(Cat(loop[:8], self.data)),
+                            w.brr_offset.eq(1),
+                            w.buf_pos.eq(0),
+                        ]
+                    delay = w.kon_delay - 1
+                    m.d.sync += [
+                        w.env.eq(0),
+                        w.hidden.eq(0),
+                        w.kon_delay.eq(delay),
+                        w.interp.eq(Mux(delay[:2].any(), 0x4000, 0)),
+                        pitch.eq(0),
+                    ]
+
+            with m.Case(4):
+                m.d.sync += [adsr2.eq(data), header.eq(self.data)]
+
+            with m.Case(5):
+                m.d.sync += [
+                    gain.eq(data),
+                    acc.eq(product >> 11),
+                    byte_a.eq(self.data),
+                ]
+
+            with m.Case(6):
+                m.d.sync += [
+                    voll.eq(data),
+                    acc.eq(acc + (product >> 11)),
+                    byte_b.eq(self.data),
+                ]
+
+            with m.Case(7):
+                m.d.sync += [volr.eq(data), acc.eq(acc + (product >> 11))]
+
+            with m.Case(8):
+                sample = Signal(signed(18))
+                m.d.comb += sample.eq(acc[:16].as_signed() + (product >> 11))
+                m.d.sync += out.eq(clamp16(sample) & ~1)
+                with m.If((glob[Reg.NON] & vbit).any()):
+                    m.d.sync += out.eq(noise << 1)
+
+            with m.Case(9):
+                m.d.sync += prev.eq((product >> 11) & ~1)
+
+            with m.Case(10):
+                m.d.sync += main_l.eq(clamp16(main_l + (product >> 7)))
+                m.d.comb += [status_write.data.eq(prev[8:]), status_write.en.eq(1)]
+
+                with m.If(decoding):
+                    m.d.sync += w.buf_pos.eq(Mux(w.buf_pos >= 8, 0, w.buf_pos + 4))
+                    with m.If(w.brr_offset >= 7):
+                        m.d.sync += w.brr_offset.eq(1)
+                        with m.If(header[0]):
+                            m.d.sync += [w.brr_addr.eq(loop), endx.eq(endx | vbit)]
+                        with m.Else():
+                            m.d.sync += w.brr_addr.eq(w.brr_addr + 9)
+                    with m.Else():
+                        m.d.sync += w.brr_offset.eq(w.brr_offset + 2)
+                m.d.sync += w.interp.eq(Mux(pitched > 0x7FFF, 0x7FFF, pitched))
+
+                with m.If((w.kon_delay == 0) & (w.mode == Mode.RELEASE)):
+                    m.d.sync += w.env.eq(Mux(env < 8, 0, env - 8))
+                with m.Elif(w.kon_delay == 0):
+                    m.d.sync += w.hidden.eq(target)
+                    with m.If((target >> 8 == sustain) & (w.mode == Mode.DECAY)):
+                        m.d.sync += w.mode.eq(Mode.SUSTAIN)
+                    over = (target < 0) | (target > 0x7FF)
+                    with m.If(over & (w.mode == Mode.ATTACK)):
+                        m.d.sync += w.mode.eq(Mode.DECAY)
+                    with m.If(fire):
+                        m.d.sync += w.env.eq(
+                            Mux(target < 0, 0, Mux(target > 0x7FF, 0x7FF, target))
+                        )
+                # silence at the end of a sample that does not loop, or on reset
+                ended = (header[:2] == 1) & (w.kon_delay == 0)
+                with m.If(flg[7] | ended):
+                    m.d.sync += [w.mode.eq(Mode.RELEASE), w.env.eq(0)]
+
+            with m.Case(11):
+                m.d.sync += main_r.eq(clamp16(main_r + (product >> 7)))
+                m.d.comb += [
+                    status_write.data.eq(w.env[4:]),
+                    status_write.en.eq(1),
+                    state_write.en.eq(1),
+                ]
+
+        """Decoded samples replace the oldest ones"""
+        with m.If(decoding & (step >= 7) & (step <= 10)):
+            m.d.comb += buf_write.en.eq(1)
+            m.d.sync += [w.p2.eq(w.p1), w.p1.eq(decoded)]
+
+        """Once every voice is mixed"""
+        with m.If(last):
+            with m.Switch(step):
+                with m.Case(12):
+                    m.d.sync += self.left.eq(clamp16(product >> 7))
+                with m.Case(13):
+                    m.d.sync += self.right.eq(clamp16(product >> 7))
+                with m.Case(14):
+                    with m.If(flg[6]):  # mute
+                        m.d.sync += [self.left.eq(0), self.right.eq(0)]
+                    m.d.sync += [self.valid.eq(1), main_l.eq(0), main_r.eq(0)]
+                    with m.If(fire):
+                        m.d.sync += noise.eq(Cat(noise[1:], noise[0] ^ noise[1]))
+                    m.d.sync += counter.eq(Mux(counter == 0, COUNTER - 1, counter - 1))
+                    for factor, residue in residues.items():
+                        m.d.sync += residue.eq(
+                            Mux(residue == 0, factor - 1, residue - 1)
+                        )
+
+                    m.d.sync += every_other.eq(~every_other)
+                    with m.If(every_other):
+                        m.d.sync += [
+                            kon.eq(new_kon),
+                            koff.eq(glob[Reg.KOFF]),
+                            new_kon.eq(0),
+                        ]
+                    with m.Else():
+                        m.d.sync += [kon.eq(0), koff.eq(0)]
+        with m.If(~last | (step != 14)):
+            m.d.sync += self.valid.eq(0)
+
+        """CPU side"""
+        selected = Signal(2)  # 0 registers, 1 ENVX or OUTX, 2 ENDX
+        m.d.comb += [
+            reg_write.addr.eq(self.reg_addr),
+            reg_write.data.eq(self.reg_din),
+            reg_write.en.eq(self.reg_we),
+            reg_cpu.addr.eq(self.reg_addr),
+            status_read.addr.eq(Cat(self.reg_addr[0], self.reg_addr[4:])),
+        ]
+        with m.If(self.reg_addr == Reg.ENDX):
+            m.d.sync += selected.eq(2)
+        with m.Elif(self.reg_addr[1:4] == Reg.ENVX >> 1):
+            m.d.sync += selected.eq(1)
+        with m.Else():
+            m.d.sync += selected.eq(0)
+        m.d.comb += self.reg_dout.eq(
+            Mux(selected == 2, endx, Mux(selected == 1, status_read.data, reg_cpu.data))
+        )
+        with m.If(self.reg_we):
+            with m.If(self.reg_addr == Reg.KON):
+                m.d.sync += new_kon.eq(self.reg_din)
+            with m.If(self.reg_addr == Reg.ENDX):
+                m.d.sync += endx.eq(0)
+
+        return m
+
+
+def run(
+    ram: bytes, regs: bytes, samples: int, backend: str = "cxxrtl"
+) -> Tuple[List[int], float]:
+    """Play the DSP alone from the ARAM and registers of a snapshot. Returns the
+    left and right samples interleaved, and the samples simulated per second not
+    counting elaboration or compilation"""
+    m = Module()
+    m.submodules.dsp = dsp = DSP(regs)
+    if backend == "cxxrtl":
+        m.submodules.aram = aram = ARAM(ram)
+        m.d.comb += aram.connect_dsp(dsp)
+        sim = CxxSimulator(m)
+    else:
+        # numpy is only needed to simulate on pysim
+        from bus import BusModel
+
+        sim = Simulator(m)
+        sim.add_process(BusModel(ram).dsp_process(dsp))
+    sim.add_clock(1 / CLOCK, domain="sync")
+
+    out: List[int] = []
+    start = perf_counter()
+    if backend == "cxxrtl":
+        # valid is high on the last cycle of every sample, step there in bulk
+        sim.step(8 * STEPS - 1)
+        for _ in range(samples):
+            out += [sim.read(dsp.left), sim.read(dsp.right)]
+            sim.step(8 * STEPS)
+    else:
+
+        def process():
+            while len(out) < 2 * samples:
+                yield
+                if (yield dsp.valid):
+                    out.extend([(yield dsp.left), (yield dsp.right)])
+
+        sim.add_sync_process(process, domain="sync")
+        sim.run()
+    return out, samples / (perf_counter() - start)
+
+
+def save(path: str, out: List[int]):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes(array("h", out).tobytes())
+
+
+# square wave, 8 samples high and 8 low, as a single looping BRR block
+SQUARE = bytes([0xC3, 0x77, 0x77, 0x77, 0x77, 0x88, 0x88, 0x88, 0x88])
+
+
+def demo() -> Tuple[bytes, bytes]:
+    """ARAM and registers with every voice playing the square wave at its own
+    pitch, voice 1 modulated by voice 0 and voice 7 playing noise"""
+    ram = bytearray(0x10000)
+    ram[0x0200:0x0204] = bytes([0x00, 0x03, 0x00, 0x03])  # SRCN 0 at 0x0300
+    ram[0x0300 : 0x0300 + len(SQUARE)] = SQUARE
+    regs = bytearray(128)
+    for n in range(8):
+        pitch = 0x0800 + 0x0200 * n
+        regs[n << 4 | Reg.VOLL] = 0x10
+        regs[n << 4 | Reg.VOLR] = 0x10 if n % 2 else 0x04
+        regs[n << 4 | Reg.PITCHL] = pitch & 0xFF
+        regs[n << 4 | Reg.PITCHH] = pitch >> 8
+        regs[n << 4 | Reg.ADSR1] = 0x8A  # attack 10, decay 0
+        regs[n << 4 | Reg.ADSR2] = 0xC4  # sustain level 6, rate 4
+    regs[Reg.MVOLL] = regs[Reg.MVOLR] = 0x7F
+    regs[Reg.KON] = 0xFF
+    regs[Reg.FLG] = 0x3C  # echo off, noise rate 28
+    regs[Reg.PMON] = 0x02
+    regs[Reg.NON] = 0x80
+    regs[Reg.DIR] = 0x02
+    return bytes(ram), bytes(regs)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="play the DSP alone, without the core")
+    parser.add_argument("file", nargs="?", help=".spc snapshot, a demo without it")
+    parser.add_argument("--seconds", type=float, default=0.1)
+    parser.add_argument("--backend", choices=["pysim", "cxxrtl"], default="cxxrtl")
+    parser.add_argument("-o", "--output", help="write the samples to a .wav file")
+    args = parser.parse_args()
+
+    if args.file is not None:
+        from spc import SPC
+
+        spc = SPC.load(args.file)
+        ram, regs = spc.ram, spc.dsp
+    else:
+        ram, regs = demo()
+
+    samples = round(args.seconds * RATE)
+    out, rate = run(ram, regs, samples, args.backend)
+    peak = max((abs(s) for s in out), default=0)
+    print(f"{samples:,} samples ({samples / RATE:.2f}s), peak {peak}")
+    print(f"{rate:,.0f} samples/s simulated, {rate / RATE:.3f}x real time")
+    if args.output is not None:
+        save(args.output, out)
@@ -0,0 +1,277 @@
+# hwbench.py: Area and timing of the core, the ALU and every instruction
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+import json
+import os
+import re
+import subprocess
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from nmigen.back import rtlil
+
+from alu import ALU_big, Divider, Multiplier
+from core import Core
+from counters import Counters
+from dsp import DSP
+from instruction import implemented
+
+YOSYS = os.environ.get("YOSYS", "yosys")
+SRC = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(os.path.dirname(SRC), "bench", "baseline.json")
+
+
+class Arch(NamedTuple):
+    synth: str  # yosys script
+    pnr: List[str]  # nextpnr command, without the design
+    lut: str  # cell type prefixes
+    ff: str
+
+
+ARCHES = {
+    "ice40": Arch(
+        "synth_ice40 -top top",
+        ["nextpnr-ice40", "--hx8k", "--package", "ct256"],
+        "SB_LUT",
+        "SB_DFF",
+    ),
+    "ecp5": Arch("synth_ecp5 -top top", ["nextpnr-ecp5", "--25k"], "LUT", "TRELLIS_FF"),
+}
+
+# metric: True when a higher value is better
+METRICS = {
+    "elaborate": False,  # seconds to elaborate and convert to RTLIL
+    "rtlil": False,  # bytes
+    "cells": False,
+    "luts": False,
+    "ffs": False,
+    "fmax": True,  # MHz estimated by nextpnr
+}
+
+# metrics that depend on the machine or the checkout path, not kept in a baseline
+LOCAL = ["elaborate", "rtlil"]
+
+
+# ALU_big implementations to compare: runner flag, keyword, choices
+VARIANTS = [("--mul", "multiplier", Multiplier), ("--div", "divider", Divider)]
+
+
+def targets() -> List[str]:
+    alus = [
+        f"alu {flag} {variant.value}"
+        for flag, _, choices in VARIANTS
+        for variant in list(choices)[1:]
+    ]
+    instrs = [implemented.name(i) for i in implemented.implemented]
+    return ["core", "core counters", "dsp", "alu"] + alus + instrs
+
+
+def design(target: str):
+    """A fresh elaboratable for the target, instructions get a core of their own"""
+    if target == "core":
+        return Core()
+    if target == "core counters":
+        return Core(counters=Counters())
+    if target == "dsp":
+        return DSP()
+    if target.split()[0] == "alu":
+        options = dict(zip(target.split()[1::2], target.split()[2::2]))
+        return ALU_big(
+            **{
+                keyword: choices(options[flag])
+                for flag, keyword, choices in VARIANTS
+                if flag in options
+            }
+        )
+    for i in implemented.implemented:
+        if target == implemented.name(i):
+            return Core(instructions=[i])
+    raise KeyError(target)
+
+
+def synthesize(il: str, arch: Arch, workdir: str) -> Dict[str, int]:
+    with open(os.path.join(workdir, "top.il"), "w") as f:
+        f.write(il)
+    script = f"read_rtlil top.il; {arch.synth}; write_json top.json"
+    script += "; tee -q -o stat.json stat -json"
+    subprocess.run([YOSYS, "-q", "-p", script], cwd=workdir, check=True)
+    with open(os.path.join(workdir, "stat.json")) as f:
+        stat = json.load(f)["design"]
+    types = stat["num_cells_by_type"]
+    return {
+        "cells": stat["num_cells"],
+        "luts": sum(n for t, n in types.items() if t.startswith(arch.lut)),
+        "ffs": sum(n for t, n in types.items() if t.startswith(arch.ff)),
+    }
+
+
+def place_and_route(arch: Arch, workdir: str) -> Optional[float]:
+    """Estimated fmax in MHz, None for purely combinational designs"""
+    cmd = arch.pnr + ["--json", "top.json", "--log", "pnr.log"]
+    if arch.pnr[0] == "nextpnr-ice40":
+        cmd.append("--pcf-allow-unconstrained")
+    subprocess.run(cmd, cwd=workdir, capture_output=True, check=True)
+    with open(os.path.join(workdir, "pnr.log")) as f:
+        found = re.findall(r"Max frequency for clock .*?: ([\d.]+) MHz", f.read())
+    return float(found[-1]) if found else None
+
+
+def measure(target: str, arch: str, pnr: bool) -> Dict[str, Optional[float]]:
+    """Every metric of a single target, meant to run in a worker process"""
+    top = design(target)
+    start = perf_counter()
+    il = rtlil.convert(top, ports=top.ports())
+    result = {"elaborate": perf_counter() - start, "rtlil": len(il)}
+
+    with TemporaryDirectory() as workdir:
+        result.update(synthesize(il, ARCHES[arch], workdir))
+        result["fmax"] = place_and_route(ARCHES[arch], workdir) if pnr else None
+    return result
+
+
+def pc_path(instructions) -> Tuple[Dict[str, int], int]:
+    """Cells of the PC unit, and the 16 bit adders outside the ALU, of a core
+    with these instructions. Coarse grain so adders can still be counted"""
+    top = Core(instructions=instructions)
+    il = rtlil.convert(top, ports=top.ports())
+    with TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "top.il"), "w") as f:
+            f.write(il)
+        script = "read_rtlil top.il; hierarchy -top top; proc; opt; wreduce; alumacc"
+        script += "; opt; write_json top.json"
+        subprocess.run([YOSYS, "-q", "-p", script], cwd=workdir, check=True)
+        with open(os.path.join(workdir, "top.json")) as f:
+            modules = json.load(f)["modules"]
+
+    cells = {}
+    for cell in modules["pc"]["cells"].values():
+        cells[cell["type"]] = cells.get(cell["type"], 0) + 1
+    adders = sum(
+        int(cell["parameters"]["Y_WIDTH"], 2) >= 16
+        for name, module in modules.items()
+        if name != "alu"
+        for cell in module["cells"].values()
+        if cell["type"] in ("$add", "$alu")
+    )
+    return cells, adders
+
+
+def check_pc() -> bool:
+    """The PC path must not grow as instructions are added"""
+    ok = True
+    first = None
+    for n in range(1, len(implemented.implemented) + 1):
+        cells, adders = pc_path(implemented.implemented[:n])
+        first = first or cells
+        good = cells == first and adders == 1
+        ok &= good
+        grew = "" if good else "  <- grew"
+        print(
+            f"{n} instructions: pc {sum(cells.values())} cells, {adders} adders{grew}"
+        )
+    return ok
+
+
+def regressions(
+    results: Dict[str, dict], baseline: Dict[str, dict], threshold: float, slack: float
+) -> List[str]:
+    """Metrics worse than the baseline by more than threshold, elaboration time is
+    noisy and uses slack instead"""
+    found = []
+    for target, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(target, {}).get(metric)
+            if value is None or not old:
+                continue
+            change = (value - old) / old
+            if METRICS[metric]:
+                change = -change
+            if change > (slack if metric == "elaborate" else threshold):
+                found.append(f"{target} {metric}: {old:g} -> {value:g} ({change:+.1%})")
+    return found
+
+
+def report(results: Dict[str, dict]):
+    width = max(len(t) for t in results)
+    print(
+        f"{'target':<{width}}  {'elab':>6}  {'rtlil':>8}  {'cells':>6}"
+        f"  {'luts':>6}  {'ffs':>5}  {'fmax':>7}"
+    )
+    for target, r in results.items():
+        fmax = f"{r['fmax']:7.2f}" if r["fmax"] is not None else f"{'-':>7}"
+        print(
+            f"{target:<{width}}  {r['elaborate']:6.2f}  {r['rtlil']:8}  {r['cells']:6}"
+            f"  {r['luts']:6}  {r['ffs']:5}  {fmax}"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="hardware cost of every target")
+    parser.add_argument("names", nargs="*", help="only measure these targets")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--arch", choices=ARCHES, default="ice40")
+    parser.add_argument("--no-pnr", action="store_true", help="skip nextpnr and fmax")
+    parser.add_argument("-o", "--output", default="hwbench.json")
+    parser.add_argument(
+        "--baseline", default=BASELINE, help="fail on regressions against this file"
+    )
+    parser.add_argument("--no-baseline", action="store_true", help="only measure")
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="write the results to it"
+    )
+    parser.add_argument("--threshold", type=float, default=0.05)
+    parser.add_argument("--time-threshold", type=float, default=0.5)
+    parser.add_argument(
+        "--check-pc", action="store_true", help="only check the PC path is shared"
+    )
+    args = parser.parse_args()
+
+    if args.check_pc:
+        sys.exit(not check_pc())
+
+    jobs = targets()
+    if args.names:
+        names = set(args.names)
+        jobs = [t for t in jobs if {t, t.split()[0], t.split(".")[-1]} & names]
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(measure, t, args.arch, not args.no_pnr) for t in jobs]
+        results = {t: f.result() for t, f in zip(jobs, futures)}
+
+    report(results)
+    with open(args.output, "w") as f:
+        json.dump({"arch": args.arch, "results": results}, f, indent=2)
+
+    if args.update_baseline:
+        # merged, so measuring some targets keeps the others
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            baseline = {"arch": args.arch, "results": {}}
+        if baseline["arch"] != args.arch:
+            baseline = {"arch": args.arch, "results": {}}
+        for target, metrics in results.items():
+            baseline["results"][target] = {
+                k: v for k, v in metrics.items() if k not in LOCAL
+            }
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+
+    elif not args.no_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["arch"] != args.arch:
+            sys.exit(f"baseline is for {baseline['arch']}, not {args.arch}")
+        found = regressions(
+            results, baseline["results"], args.threshold, args.time_threshold
+        )
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(bool(found))
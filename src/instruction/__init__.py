@@ -2,17 +2,21 @@
 # Copyright (C) 2021 Martín Bárez <martinbarez>
 
 from abc import ABC, abstractmethod
+from typing import List
 
-from nmigen import Module, Signal, Value
+from nmigen import Module, Signal
 
+from microcode import MicroOp
 from snapshot import Snapshot
 
 
 class Instruction(ABC):
-    @staticmethod
-    @abstractmethod
-    def synth(m: Module, instr: Value):
-        pass
+    opcode: int
+    microcode: List[MicroOp]  # one per cycle, the first one sees the opcode
+
+    # most bus accesses the check looks at, sizes the Snapshot buffers
+    reads: int = 8  # including the opcode fetch
+    writes: int = 8
 
     @staticmethod
     @abstractmethod
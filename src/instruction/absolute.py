@@ -1,11 +1,20 @@
 # absolute.py: Absolute address instructions
 # Copyright (C) 2021 Martín Bárez <martinbarez>
 
-from nmigen import Cat, Const, Module, Signal
+from nmigen import Cat, Module, Signal
 from nmigen.asserts import Assert, Past
 
 from alu import Operation
 from instruction import Instruction
+from microcode import (
+    ABSOLUTE,
+    FETCH,
+    AddrSource,
+    MicroOp,
+    PCControl,
+    Source,
+    Writeback,
+)
 from registers import add16
 from snapshot import Snapshot
 
@@ -13,52 +22,15 @@ from snapshot import Snapshot
 # MOV A, !abs   E5      3 4   N-----Z-  A <- (abs)
 class MOV_A_read(Instruction):
     opcode = 0xE5
+    reads = 4
+    writes = 0
 
-    def synth(core, m: Module):
-        with m.If(core.cycle == 1):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.enable.eq(1),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(2),
-            ]
-        with m.If(core.cycle == 2):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.tmp.eq(core.dout),
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.enable.eq(1),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(3),
-            ]
-
-        with m.If(core.cycle == 3):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.reg.PC.eq(core.reg.PC),
-                core.enable.eq(1),
-                core.addr.eq(Cat(core.tmp, core.dout)),
-                core.RWB.eq(1),
-                core.cycle.eq(4),
-            ]
-
-        with m.If(core.cycle == 4):
-            m.d.comb += [
-                core.alu.inputa.eq(core.dout),
-                core.alu.inputb.eq(Const(0x00)),
-                core.alu.oper.eq(Operation.OOR),
-            ]
-            m.d.sync += [
-                core.reg.A.eq(core.alu.result),
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.enable.eq(1),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(1),
-            ]
+    microcode = ABSOLUTE + [
+        MicroOp(addr=AddrSource.ABS),
+        FETCH._replace(
+            oper=Operation.OOR, a=Source.DOUT, b=Source.ZERO, writeback=Writeback.A
+        ),
+    ]
 
     def check(m: Module, data: Snapshot, alu: Signal):
         m.d.comb += [
@@ -93,58 +65,14 @@ class MOV_A_read(Instruction):
 # MOV    !abs, A   C5      3 5   --------  A -> (abs)
 class MOV_A_write(Instruction):
     opcode = 0xC5
+    reads = 3
+    writes = 1
 
-    def synth(core, m: Module):
-        with m.If(core.cycle == 1):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.enable.eq(1),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(2),
-            ]
-        with m.If(core.cycle == 2):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.tmp.eq(core.dout),
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.enable.eq(1),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(3),
-            ]
-
-        with m.If(core.cycle == 3):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.reg.PC.eq(core.reg.PC),
-                core.enable.eq(1),
-                core.addr.eq(Cat(core.tmp, core.dout)),
-                core.din.eq(core.reg.A),
-                core.RWB.eq(0),
-                core.cycle.eq(4),
-            ]
-
-        with m.If(core.cycle == 4):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.reg.PC.eq(core.reg.PC),
-                core.enable.eq(0),
-                core.addr.eq(core.reg.PC),
-                core.RWB.eq(1),
-                core.cycle.eq(5),
-            ]
-
-        with m.If(core.cycle == 5):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.enable.eq(1),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(1),
-            ]
+    microcode = ABSOLUTE + [
+        MicroOp(addr=AddrSource.ABS, RWB=0, din=1),
+        MicroOp(enable=0),
+        FETCH,
+    ]
 
     def check(m: Module, data: Snapshot, alu: Signal):
         m.d.comb += [
@@ -179,53 +107,15 @@ class MOV_A_write(Instruction):
 # ADC    A, !abs   85      3 4   NV--H-ZC  A += (abs)        + C
 class ADC(Instruction):
     opcode = 0x85
+    reads = 4
+    writes = 0
 
-    def synth(core, m: Module):
-        with m.If(core.cycle == 1):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.enable.eq(1),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(2),
-            ]
-        with m.If(core.cycle == 2):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.tmp.eq(core.dout),
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.enable.eq(1),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(3),
-            ]
-
-        with m.If(core.cycle == 3):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.reg.PC.eq(core.reg.PC),
-                core.enable.eq(1),
-                core.addr.eq(Cat(core.tmp, core.dout)),
-                core.RWB.eq(1),
-                core.cycle.eq(4),
-            ]
-
-        with m.If(core.cycle == 4):
-            m.d.comb += [
-                core.alu.inputa.eq(core.reg.A),
-                core.alu.inputb.eq(core.dout),
-                core.alu.oper.eq(Operation.ADC),
-            ]
-
-            m.d.sync += [
-                core.reg.A.eq(core.alu.result),
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.enable.eq(1),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(1),
-            ]
+    microcode = ABSOLUTE + [
+        MicroOp(addr=AddrSource.ABS),
+        FETCH._replace(
+            oper=Operation.ADC, a=Source.A, b=Source.DOUT, writeback=Writeback.A
+        ),
+    ]
 
     def check(m: Module, data: Snapshot, alu: Signal):
         m.d.comb += [
@@ -259,37 +149,12 @@ class ADC(Instruction):
 # JMP    !abs      5F      3 3   --------  PC <- abs     : allows to jump anywhere in the memory space
 class JMP(Instruction):
     opcode = 0x5F
+    reads = 3
+    writes = 0
 
-    def synth(core, m: Module):
-        with m.If(core.cycle == 1):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.enable.eq(1),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(2),
-            ]
-        with m.If(core.cycle == 2):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.tmp.eq(core.dout),
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.enable.eq(1),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(3),
-            ]
-
-        with m.If(core.cycle == 3):
-            m.d.comb += core.alu.oper.eq(Operation.NOP)
-            m.d.sync += [
-                core.reg.PC.eq(Cat(core.tmp, core.dout)),
-                core.enable.eq(1),
-                core.addr.eq(Cat(core.tmp, core.dout)),
-                core.RWB.eq(1),
-                core.cycle.eq(1),
-            ]
+    microcode = ABSOLUTE + [
+        MicroOp(pc=PCControl.LOAD, addr=AddrSource.ABS),
+    ]
 
     def check(m: Module, data: Snapshot, alu: Signal):
         m.d.comb += [
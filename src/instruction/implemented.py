@@ -301,3 +301,8 @@ implemented = (
 
 for i in implemented:
     i()
+
+
+def name(instr) -> str:
+    """module.class of an instruction, as core.py --instr takes it"""
+    return f"{instr.__module__.split('.')[-1]}.{instr.__name__}"
@@ -6,6 +6,7 @@ from nmigen.asserts import Assert, Past
 
 from alu import Operation
 from instruction import Instruction
+from microcode import FETCH, MicroOp, Source, Writeback
 from registers import add16
 from snapshot import Snapshot
 
@@ -13,50 +14,13 @@ from snapshot import Snapshot
 # MUL YA    CF      1 9   N-----Z-  YA <- Y*A
 class MUL(Instruction):
     opcode = 0xCF
+    reads = 1
+    writes = 0
 
-    def synth(core, m: Module):
-        for i in range(1, 8):
-            with m.If(core.cycle == i):
-                m.d.comb += [
-                    core.alu.inputa.eq(core.reg.Y),
-                    core.alu.inputb.eq(core.reg.A),
-                    core.alu.oper.eq(Operation.MUL),
-                ]
-                m.d.sync += [
-                    core.reg.PC.eq(core.reg.PC),
-                    core.enable.eq(0),
-                    core.addr.eq(core.reg.PC),
-                    core.RWB.eq(1),
-                    core.cycle.eq(i + 1),
-                ]
-
-        with m.If(core.cycle == 8):
-            m.d.comb += [
-                core.alu.oper.eq(Operation.MUL),
-            ]
-
-            m.d.sync += [
-                core.reg.Y.eq(core.alu.result),
-                core.enable.eq(0),
-                core.reg.PC.eq(core.reg.PC),
-                core.addr.eq(core.reg.PC),
-                core.RWB.eq(1),
-                core.cycle.eq(9),
-            ]
-
-        with m.If(core.cycle == 9):
-            m.d.comb += [
-                core.alu.oper.eq(Operation.MUL),
-            ]
-
-            m.d.sync += [
-                core.reg.A.eq(core.alu.result),
-                core.enable.eq(1),
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(1),
-            ]
+    microcode = [MicroOp(oper=Operation.MUL, a=Source.Y, b=Source.A, enable=0)] * 7 + [
+        MicroOp(oper=Operation.MUL, enable=0, writeback=Writeback.Y),
+        FETCH._replace(oper=Operation.MUL, writeback=Writeback.A),
+    ]
 
     def check(m: Module, data: Snapshot, alu: Signal):
         m.d.comb += [
@@ -88,50 +52,13 @@ class MUL(Instruction):
 # DIV YA,X      9E      1 12  NV--H-Z-  Y <- YA % X and A <- YA / X
 class DIV(Instruction):
     opcode = 0x9E
+    reads = 1
+    writes = 0
 
-    def synth(core, m: Module):
-        for i in range(1, 11):
-            with m.If(core.cycle == i):
-                m.d.comb += [
-                    core.alu.inputa.eq(core.reg.Y),
-                    core.alu.inputb.eq(core.reg.A),
-                    core.alu.oper.eq(Operation.DIV),
-                ]
-                m.d.sync += [
-                    core.reg.PC.eq(core.reg.PC),
-                    core.enable.eq(0),
-                    core.addr.eq(core.reg.PC),
-                    core.RWB.eq(1),
-                    core.cycle.eq(i + 1),
-                ]
-
-        with m.If(core.cycle == 11):
-            m.d.comb += [
-                core.alu.oper.eq(Operation.DIV),
-            ]
-
-            m.d.sync += [
-                core.reg.Y.eq(core.alu.result),
-                core.enable.eq(0),
-                core.reg.PC.eq(core.reg.PC),
-                core.addr.eq(core.reg.PC),
-                core.RWB.eq(1),
-                core.cycle.eq(12),
-            ]
-
-        with m.If(core.cycle == 12):
-            m.d.comb += [
-                core.alu.oper.eq(Operation.DIV),
-            ]
-
-            m.d.sync += [
-                core.reg.A.eq(core.alu.result),
-                core.enable.eq(1),
-                core.reg.PC.eq(add16(core.reg.PC, 1)),
-                core.addr.eq(add16(core.reg.PC, 1)),
-                core.RWB.eq(1),
-                core.cycle.eq(1),
-            ]
+    microcode = [MicroOp(oper=Operation.DIV, a=Source.Y, b=Source.A, enable=0)] * 10 + [
+        MicroOp(oper=Operation.DIV, enable=0, writeback=Writeback.Y),
+        FETCH._replace(oper=Operation.DIV, writeback=Writeback.A),
+    ]
 
     def check(m: Module, data: Snapshot, alu: Signal):
         m.d.comb += [
@@ -0,0 +1,172 @@
+# microcode.py: Microcode ROM and sequencer generated from the instructions
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+from enum import Enum
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from nmigen import Elaboratable, Memory, Module, Mux, Shape, Signal
+from nmigen.build import Platform
+from nmigen.hdl.rec import Record
+
+from alu import Operation
+
+
+class Source(Enum):
+    """ALU input"""
+
+    ZERO = 0
+    A = 1
+    Y = 2
+    DOUT = 3
+
+
+class PCControl(Enum):
+    HOLD = 0
+    INC = 1
+    LOAD = 2  # from the absolute address in tmp and dout
+
+
+class AddrSource(Enum):
+    """Bus address of the next cycle"""
+
+    PC = 0
+    PC_INC = 1
+    ABS = 2  # tmp and dout
+
+
+class Writeback(Enum):
+    """Register loaded with the ALU result"""
+
+    NONE = 0
+    A = 1
+    Y = 2
+
+
+class MicroOp(NamedTuple):
+    """Everything the core does in one cycle of an instruction"""
+
+    oper: Operation = Operation.NOP
+    a: Source = Source.ZERO
+    b: Source = Source.ZERO
+    pc: PCControl = PCControl.HOLD
+    addr: AddrSource = AddrSource.PC
+    enable: int = 1
+    RWB: int = 1  # 1 = read, 0 = write
+    din: int = 0  # din <- A
+    tmp: int = 0  # tmp <- dout
+    writeback: Writeback = Writeback.NONE
+
+
+# the cycles every instruction shares
+
+# read the byte after PC and move on to it
+FETCH = MicroOp(pc=PCControl.INC, addr=AddrSource.PC_INC)
+
+# opcode and first address byte, the second one is on dout the cycle after
+ABSOLUTE = [FETCH, FETCH._replace(tmp=1)]
+
+
+LAYOUT = [
+    ("oper", Operation),
+    ("a", Source),
+    ("b", Source),
+    ("pc", PCControl),
+    ("addr", AddrSource),
+    ("enable", 1),
+    ("RWB", 1),
+    ("din", 1),
+    ("tmp", 1),
+    ("writeback", Writeback),
+    ("last", 1),  # the next cycle fetches an opcode
+]
+
+
+def pack(uop: MicroOp, last: bool) -> int:
+    """The ROM word of a MicroOp, fields in LAYOUT order from the LSB"""
+    value = 0
+    offset = 0
+    for (name, shape), field in zip(LAYOUT, [*uop, last]):
+        value |= int(getattr(field, "value", field)) << offset
+        offset += Shape.cast(shape).width
+    return value
+
+
+def prefetched(microcode: List[MicroOp]) -> List[MicroOp]:
+    """Read the next opcode during the idle bus cycle that precedes a final plain
+    fetch, so the instruction takes one cycle less. Not cycle accurate"""
+    if len(microcode) < 2:
+        return microcode
+    *body, idle, last = microcode
+    if last != FETCH or idle.enable or idle.pc is not PCControl.HOLD:
+        return microcode
+    return body + [idle._replace(pc=FETCH.pc, addr=FETCH.addr, enable=1, RWB=1)]
+
+
+def shortened(microcode: List[MicroOp], steps: Dict[Operation, int]) -> List[MicroOp]:
+    """Leave out the idle cycles of a multi cycle ALU operation that an ALU_big with
+    turbo skips, steps as in ALU_big.steps. The cycles that feed it and those that
+    write back stay. Not cycle accurate"""
+    first = microcode[0]
+    if first.enable or first.oper not in steps:
+        return microcode
+    idle = next((n for n, uop in enumerate(microcode) if uop != first), len(microcode))
+    if steps[first.oper] >= idle:
+        return microcode
+    return microcode[: steps[first.oper]] + microcode[idle:]
+
+
+def assemble(
+    instructions, prefetch: bool = False, steps: Optional[Dict[Operation, int]] = None
+) -> Tuple[List[int], List[int]]:
+    """Dispatch table from opcode to microcode address, and the microcode.
+    Address 0 holds the single fetch cycle of unimplemented opcodes"""
+    dispatch = [0] * 256
+    code = [FETCH]
+    ends = [0]
+    for i in instructions:
+        if not i.microcode:
+            raise ValueError(f"{i.__name__} has no microcode")
+        microcode = i.microcode
+        if steps is not None:
+            microcode = shortened(microcode, steps)
+        if prefetch:
+            microcode = prefetched(microcode)
+        dispatch[i.opcode] = len(code)
+        code += microcode
+        ends.append(len(code) - 1)
+    return dispatch, [pack(uop, n in ends) for n, uop in enumerate(code)]
+
+
+class Sequencer(Elaboratable):
+    """Looks up the microcode of the current cycle. On the first cycle of an
+    instruction its opcode is on the bus, so the dispatch table is used"""
+
+    def __init__(
+        self,
+        instructions,
+        prefetch: bool = False,
+        steps: Optional[Dict[Operation, int]] = None,
+    ):
+        self.opcode = Signal(8)
+        self.start = Signal()  # first cycle of an instruction
+        self.uop = Record(LAYOUT)
+
+        dispatch, code = assemble(instructions, prefetch, steps)
+        self.upc = Signal(range(len(code) + 1))  # microcode address of next cycle
+        self.dispatch = Memory(width=len(self.upc), depth=256, init=dispatch)
+        self.code = Memory(width=len(self.uop), depth=len(code), init=code)
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+
+        m.submodules.dispatch = dispatch = self.dispatch.read_port(domain="comb")
+        m.submodules.code = code = self.code.read_port(domain="comb")
+
+        m.d.comb += [
+            dispatch.addr.eq(self.opcode),
+            code.addr.eq(Mux(self.start, dispatch.data, self.upc)),
+            self.uop.eq(code.data),
+        ]
+        m.d.sync += self.upc.eq(code.addr + 1)
+
+        return m
@@ -0,0 +1,376 @@
+# model.py: Cycle accurate reference model of the SPC-700 CPU
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Bus(NamedTuple):
+    addr: int
+    data: Optional[int]  # byte read or written, None while the bus is idle
+    RWB: int  # 1 = read, 0 = write
+    enable: int
+
+
+def add16(value: int, incr: int) -> int:
+    """Mirror of registers.add16"""
+    return (value + incr) & 0xFFFF
+
+
+INC = [add16(pc, 1) for pc in range(0x10000)]
+
+
+def signed(value: int) -> int:
+    return value - 0x100 if value & 0x80 else value
+
+
+class Model:
+    """Executes whole instructions, the bus cycles Core would drive are kept in
+    trace when it is a list. Flags and results follow the ALU_big operations."""
+
+    def __init__(self, mem: bytes = b"", prefetch: bool = False):
+        self.mem = bytearray(0x10000)
+        self.mem[: len(mem)] = mem
+        self.prefetch = prefetch  # see Core, idle cycles before a fetch are used
+
+        self.A = 0
+        self.X = 0
+        self.Y = 0
+        self.SP = 0
+        self.PC = 0
+        self.N = self.V = self.P = self.B = self.H = self.I = self.Z = self.C = 0
+
+        self.cycles = 0
+        self.trace: Optional[List[Bus]] = None
+
+        self.table: List[Callable[[], None]] = [self.default] * 256
+        self.buses: List[Callable[[], None]] = [self.default_bus] * 256
+        self.timing = [1] * 256
+        for opcode, (name, cycles) in self.opcodes.items():
+            self.table[opcode] = getattr(self, name)
+            self.buses[opcode] = getattr(self, f"{name}_bus")
+            self.timing[opcode] = cycles
+        if prefetch:
+            self._prefetch()
+
+    def _prefetch(self):
+        """Take the cycles Core(prefetch) saves out of timing and of the bus
+        cycles, as microcode.prefetched shortens the microcode"""
+        # nmigen is only needed for the prefetch variant
+        from instruction import implemented
+        from microcode import prefetched
+
+        for i in implemented.implemented:
+            saved = len(i.microcode) - len(prefetched(i.microcode))
+            if saved and i.opcode in self.opcodes:
+                self.timing[i.opcode] -= saved
+                self.buses[i.opcode] = self._shortened(self.buses[i.opcode], saved)
+
+    def _shortened(self, bus: Callable[[], None], saved: int) -> Callable[[], None]:
+        """bus without its last saved cycles, the idle ones the next fetch takes"""
+
+        def shortened():
+            bus()
+            del self.trace[-saved:]
+
+        return shortened
+
+    @property
+    def PSW(self) -> int:
+        return (
+            self.N << 7
+            | self.V << 6
+            | self.P << 5
+            | self.B << 4
+            | self.H << 3
+            | self.I << 2
+            | self.Z << 1
+            | self.C
+        )
+
+    @PSW.setter
+    def PSW(self, value: int):
+        self.N, self.V, self.P, self.B = [value >> i & 1 for i in range(7, 3, -1)]
+        self.H, self.I, self.Z, self.C = [value >> i & 1 for i in range(3, -1, -1)]
+
+    def step(self) -> int:
+        """Execute one instruction and return the cycles it took"""
+        opcode = self.mem[self.PC]
+        if self.trace is not None:
+            self.buses[opcode]()
+        self.table[opcode]()
+        cycles = self.timing[opcode]
+        self.cycles += cycles
+        return cycles
+
+    def run(self, cycles: int) -> int:
+        """Execute until at least cycles have elapsed, return the instruction count"""
+        table = self.table
+        buses = self.buses
+        timing = self.timing
+        mem = self.mem
+        elapsed = self.cycles
+        end = elapsed + cycles
+        count = 0
+        if self.trace is not None:
+            while elapsed < end:
+                opcode = mem[self.PC]
+                buses[opcode]()
+                table[opcode]()
+                elapsed += timing[opcode]
+                count += 1
+        else:
+            while elapsed < end:
+                opcode = mem[self.PC]
+                table[opcode]()
+                elapsed += timing[opcode]
+                count += 1
+        self.cycles = elapsed
+        return count
+
+    # ALU, see ALU_big in alu.py. DAA and DAS are still unverified there
+
+    def _nz(self, result: int) -> int:
+        self.N = result >> 7
+        self.Z = int(result == 0)
+        return result
+
+    def adc(self, a: int, b: int) -> int:
+        low = (a & 0xF) + (b & 0xF) + self.C
+        self.H = low >> 4
+        high = (a >> 4) + (b >> 4) + self.H
+        self.C = high >> 4
+        result = self._nz((high & 0xF) << 4 | low & 0xF)
+        self.V = self.N ^ self.C
+        return result
+
+    def sbc(self, a: int, b: int) -> int:
+        low = ((a & 0xF) - (b & 0xF) - self.C) & 0x1F
+        self.H = low >> 4
+        high = ((a >> 4) - (b >> 4) - self.H) & 0x1F
+        self.C = high >> 4
+        result = self._nz((high & 0xF) << 4 | low & 0xF)
+        self.V = self.N ^ self.C
+        return result
+
+    def cmp(self, a: int, b: int) -> int:
+        full = (signed(a) - signed(b)) & 0x1FF
+        self.C = full >> 8
+        result = self._nz(full & 0xFF)
+        self.V = self.N ^ self.C
+        return result
+
+    def and_(self, a: int, b: int) -> int:
+        return self._nz(a & b)
+
+    def oor(self, a: int, b: int) -> int:
+        return self._nz(a | b)
+
+    def eor(self, a: int, b: int) -> int:
+        return self._nz(a ^ b)
+
+    def inc(self, a: int) -> int:
+        return self._nz((a + 1) & 0xFF)
+
+    def dec(self, a: int) -> int:
+        return self._nz((a - 1) & 0xFF)
+
+    def asl(self, a: int) -> int:
+        self.C = a >> 7
+        return self._nz(a << 1 & 0xFF)
+
+    def lsr(self, a: int) -> int:
+        self.C = a & 1
+        return self._nz(a >> 1)
+
+    def rol(self, a: int) -> int:
+        result = (a << 1 & 0xFF) | self.C
+        self.C = a >> 7
+        return self._nz(result)
+
+    def ror(self, a: int) -> int:
+        result = a >> 1 | self.C << 7
+        self.C = a & 1
+        return self._nz(result)
+
+    def xcn(self, a: int) -> int:
+        return self._nz((a << 4 | a >> 4) & 0xFF)
+
+    def mul(self, a: int, b: int) -> int:
+        """16 bit product, N and Z come from the high byte"""
+        product = (signed(a) * signed(b)) & 0xFFFF
+        self._nz(product >> 8)
+        return product
+
+    def div(self, ya: int, x: int) -> int:
+        """Returns remainder << 8 | quotient with the hardware's overflow quirks.
+        Closed form of the 9 shift and subtract steps of ALU_big, V is the top
+        bit of the register they shift, bit 7 of the remainder"""
+        self.H = int((ya >> 8 & 0xF) >= (x & 0xF))
+        if ya >> 8 < x << 1:
+            quotient, remainder = divmod(ya, x)
+        else:
+            quotient, remainder = divmod(ya - (x << 9), 256 - x)
+            quotient = 255 - quotient
+            remainder += x
+        self.V = remainder >> 7 & 1
+        self._nz(quotient & 0xFF)
+        return (remainder & 0xFF) << 8 | quotient & 0xFF
+
+    # Instructions, the table maps every opcode to one of these. They only
+    # execute, the bus cycles come from the matching _bus method and the cycle
+    # counts from timing, so an untraced run never checks for a trace
+
+    opcodes: Dict[int, Tuple[str, int]] = {
+        0xE5: ("mov_a_read", 4),
+        0xC5: ("mov_a_write", 5),
+        0x85: ("adc_abs", 4),
+        0x5F: ("jmp_abs", 3),
+        0xCF: ("mul_ya", 9),
+        0x9E: ("div_ya_x", 12),
+    }
+
+    def _abs(self) -> int:
+        """The two address bytes after the opcode"""
+        mem = self.mem
+        pc1 = INC[self.PC]
+        return mem[pc1] | mem[INC[pc1]] << 8
+
+    def default(self):
+        """Unimplemented opcodes only fetch"""
+        self.PC = INC[self.PC]
+
+    def mov_a_read(self):
+        mem = self.mem
+        pc = self.PC
+        data = mem[mem[INC[pc]] | mem[INC[INC[pc]]] << 8]
+        self.N = data >> 7
+        self.Z = int(data == 0)
+        self.A = data
+        self.PC = (pc + 3) & 0xFFFF
+
+    def mov_a_write(self):
+        mem = self.mem
+        pc = self.PC
+        mem[mem[INC[pc]] | mem[INC[INC[pc]]] << 8] = self.A
+        self.PC = (pc + 3) & 0xFFFF
+
+    def adc_abs(self):
+        mem = self.mem
+        pc = self.PC
+        data = mem[mem[INC[pc]] | mem[INC[INC[pc]]] << 8]
+        self.A = self.adc(self.A, data)
+        self.PC = (pc + 3) & 0xFFFF
+
+    def jmp_abs(self):
+        self.PC = self._abs()
+
+    def mul_ya(self):
+        product = self.mul(self.Y, self.A)
+        self.Y = product >> 8
+        self.A = product & 0xFF
+        self.PC = INC[self.PC]
+
+    def div_ya_x(self):
+        result = self.div(self.Y << 8 | self.A, self.X)
+        self.Y = result >> 8
+        self.A = result & 0xFF
+        self.PC = INC[self.PC]
+
+    # Bus cycles Core drives for every instruction, added to trace before it
+    # executes
+
+    def _fetch_bus(self) -> int:
+        """Opcode and the two address bytes that follow it, returns the address"""
+        mem = self.mem
+        pc = self.PC
+        pc1 = INC[pc]
+        pc2 = INC[pc1]
+        self.trace += [
+            Bus(pc, mem[pc], 1, 1),
+            Bus(pc1, mem[pc1], 1, 1),
+            Bus(pc2, mem[pc2], 1, 1),
+        ]
+        return mem[pc1] | mem[pc2] << 8
+
+    def _idle_bus(self, cycles: int):
+        """Opcode fetch followed by cycles with the bus disabled"""
+        pc = self.PC
+        self.trace += [Bus(pc, self.mem[pc], 1, 1)] + [Bus(pc, None, 1, 0)] * cycles
+
+    def default_bus(self):
+        pc = self.PC
+        self.trace.append(Bus(pc, self.mem[pc], 1, 1))
+
+    def mov_a_read_bus(self):
+        addr = self._fetch_bus()
+        self.trace.append(Bus(addr, self.mem[addr], 1, 1))
+
+    def mov_a_write_bus(self):
+        addr = self._fetch_bus()
+        self.trace.append(Bus(addr, self.A, 0, 1))
+        self.trace.append(Bus(add16(self.PC, 2), None, 1, 0))
+
+    def adc_abs_bus(self):
+        self.mov_a_read_bus()
+
+    def jmp_abs_bus(self):
+        self._fetch_bus()
+
+    def mul_ya_bus(self):
+        self._idle_bus(8)
+
+    def div_ya_x_bus(self):
+        self._idle_bus(11)
+
+
+def program(seed: int, length: int, opcodes: List[int] = None) -> bytes:
+    """Random program of implemented instructions that loops back to 0 at its
+    end. Operand addresses point past the program and jumps to the start of one
+    of its instructions, so no operand byte ever executes as an opcode"""
+    if opcodes is None:
+        opcodes = [0xE5, 0xC5, 0x85, 0xCF, 0x9E, 0x00]
+    rng = Random(seed)
+    mem = bytearray(rng.getrandbits(8) for _ in range(0x10000))
+    chosen = [rng.choice(opcodes) for _ in range(length)] + [0x5F]
+    starts = []
+    pc = 0
+    for opcode in chosen:
+        starts.append(pc)
+        pc += 3 if opcode in (0xE5, 0xC5, 0x85, 0x5F) else 1
+    data = pc  # first byte past the program
+    for pc, opcode in zip(starts, chosen):
+        mem[pc] = opcode
+        if opcode == 0x5F:
+            addr = rng.choice(starts) if pc != starts[-1] else 0
+        elif opcode in (0xE5, 0xC5, 0x85):
+            addr = rng.randrange(data, 0x10000)
+        else:
+            continue
+        mem[pc + 1] = addr & 0xFF
+        mem[pc + 2] = addr >> 8
+    return bytes(mem)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="benchmark the reference model")
+    parser.add_argument("--cycles", type=int, default=10_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", action="store_true", help="also record the bus")
+    parser.add_argument("--prefetch", action="store_true", help="as Core(prefetch)")
+    args = parser.parse_args()
+
+    model = Model(program(args.seed, 0x4000), args.prefetch)
+    if args.trace:
+        model.trace = []
+
+    start = perf_counter()
+    count = model.run(args.cycles)
+    elapsed = perf_counter() - start
+
+    print(f"{count} instructions, {model.cycles} cycles in {elapsed:.2f}s")
+    print(f"{count / elapsed / 1e6:.2f} M instructions/s")
+    print(f"{model.cycles / elapsed / 1e6:.2f} M cycles/s")
+    print(f"{count / model.cycles:.3f} instructions per cycle")
@@ -0,0 +1,51 @@
+# pc.py: Program counter unit, the only adder on the PC and address path
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+from typing import List
+
+from nmigen import Elaboratable, Module, Signal
+from nmigen.build import Platform
+
+from microcode import AddrSource, PCControl
+from registers import add16
+
+
+class PCUnit(Elaboratable):
+    """Next PC and bus address from the microcode controls. The PC register
+    itself stays in Registers, the core loads it with next"""
+
+    def __init__(self, pc: Signal):
+        self.pc = pc
+        self.control = Signal(PCControl)
+        self.source = Signal(AddrSource)
+        self.target = Signal(16)  # absolute address for LOAD and ABS
+
+        self.next = Signal(16)  # PC of the next cycle
+        self.addr = Signal(16)  # bus address of the next cycle
+
+    def ports(self) -> List[Signal]:
+        return [self.pc, self.control, self.source, self.target, self.next, self.addr]
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+
+        inc = Signal(16)
+        m.d.comb += inc.eq(add16(self.pc, 1))
+
+        with m.Switch(self.control):
+            with m.Case(PCControl.HOLD):
+                m.d.comb += self.next.eq(self.pc)
+            with m.Case(PCControl.INC):
+                m.d.comb += self.next.eq(inc)
+            with m.Case(PCControl.LOAD):
+                m.d.comb += self.next.eq(self.target)
+
+        with m.Switch(self.source):
+            with m.Case(AddrSource.PC):
+                m.d.comb += self.addr.eq(self.pc)
+            with m.Case(AddrSource.PC_INC):
+                m.d.comb += self.addr.eq(inc)
+            with m.Case(AddrSource.ABS):
+                m.d.comb += self.addr.eq(self.target)
+
+        return m
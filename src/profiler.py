@@ -0,0 +1,106 @@
+# profiler.py: Cycles per opcode and per PC range of a simulation run
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+from collections import Counter
+from typing import Callable, Dict, Generator, List, Optional, Tuple
+
+from nmigen.sim import Passive, Settle, Tick
+
+from instruction import implemented
+
+
+def names() -> Dict[int, str]:
+    """module.class of every implemented opcode, as verify.py and hwbench.py"""
+    return {i.opcode: implemented.name(i) for i in implemented.implemented}
+
+
+class Profiler:
+    """Samples the core every clock and charges the cycle to the instruction in
+    flight, the one whose opcode was fetched at addr on its cycle 1. The stack of
+    a cycle is its PC range then its opcode, for flame graph tools. A cycle is
+    charged once its clock edge has passed, so a run of n cycles charges n even
+    though the process samples the state after the last edge too. With limit,
+    only that many cycles from the start are charged"""
+
+    def __init__(self, core, granularity: int = 0x100, limit: Optional[int] = None):
+        self.core = core
+        self.granularity = granularity
+        self.limit = limit
+        self.names = names()
+
+        self.cycles = [0] * 256
+        self.calls = [0] * 256  # instructions that finished
+        self.stacks: Counter = Counter()  # (first PC of the range, opcode)
+        self.flight: Optional[int] = None  # opcode still running when the run ended
+        self.spent = 0  # cycles it had run
+
+    def process(self) -> Callable[[], Generator]:
+        core = self.core
+
+        def process():
+            yield Passive()
+            opcode, base, charged = 0, 0, 0
+            while True:
+                # twice, after the bus answered on dout
+                yield Settle()
+                yield Settle()
+                fetch = (yield core.cycle) == 1
+                if fetch and self.flight is not None:
+                    # the one before ended on the edge just passed
+                    self.calls[self.flight] += 1
+                    self.flight = None
+                if charged == self.limit:
+                    return
+                if fetch:
+                    fetched = yield core.dout
+                    addr = yield core.addr
+                yield Tick()
+                if fetch:
+                    opcode = self.flight = fetched
+                    base = addr - addr % self.granularity
+                    self.spent = 0
+                self.cycles[opcode] += 1
+                self.spent += 1
+                self.stacks[base, opcode] += 1
+                charged += 1
+
+        return process
+
+    def name(self, opcode: int) -> str:
+        return f"{opcode:02X} {self.names.get(opcode, 'unimplemented')}"
+
+    def span(self, base: int) -> str:
+        return f"{base:04X}-{min(base + self.granularity, 0x10000) - 1:04X}"
+
+    def ranges(self) -> List[Tuple[int, int]]:
+        """Cycles spent in every PC range, hottest first"""
+        spent: Counter = Counter()
+        for (base, _), cycles in self.stacks.items():
+            spent[base] += cycles
+        return spent.most_common()
+
+    def report(self, top: int = 20):
+        total = sum(self.cycles)
+        unfinished = "" if self.flight is None else " and one unfinished"
+        print(f"{total} cycles, {sum(self.calls)} instructions{unfinished}")
+        print(f"{'opcode':<28} {'calls':>9} {'cycles':>10} {'share':>6} {'avg':>5}")
+        hottest = sorted(range(256), key=lambda op: -self.cycles[op])
+        for op in [op for op in hottest if self.cycles[op]][:top]:
+            calls = self.calls[op]
+            # the unfinished instruction would pull its average down
+            done = self.cycles[op] - (self.spent if op == self.flight else 0)
+            average = f"{done / calls:5.2f}" if calls else f"{'-':>5}"
+            print(
+                f"{self.name(op):<28} {calls:>9} {self.cycles[op]:>10}"
+                f" {self.cycles[op] / total:6.1%} {average}"
+            )
+        print("hottest PC ranges")
+        for base, cycles in self.ranges()[:top]:
+            print(f"  {self.span(base)} {cycles:>10} {cycles / total:6.1%}")
+
+    def save(self, path: str):
+        """Collapsed stacks, one "frame;frame cycles" line each, as read by
+        flamegraph.pl, speedscope and inferno"""
+        with open(path, "w") as f:
+            for (base, opcode), cycles in sorted(self.stacks.items()):
+                f.write(f"{self.span(base)};{self.name(opcode)} {cycles}\n")
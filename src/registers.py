@@ -3,19 +3,21 @@
 
 from __future__ import annotations
 
-from nmigen import Cat, Signal, Value
+from nmigen import Signal, Value
 
 
 class Status:
-    def __init__(self):
-        self.N = Signal(reset_less=True)  # Negative
-        self.V = Signal(reset_less=True)  # oVerflow
-        self.P = Signal(reset_less=True)  # direct Page
-        self.B = Signal(reset_less=True)  # Break
-        self.H = Signal(reset_less=True)  # Half carry
-        self.I = Signal(reset_less=True)  # Interrupt enabled (unused)
-        self.Z = Signal(reset_less=True)  # Zero
-        self.C = Signal(reset_less=True)  # Carry
+    def __init__(self, value: int = 0):
+        """value is the power on PSW, bits in NVPBHIZC order"""
+        bits = [value >> i & 1 for i in range(8)]
+        self.N = Signal(reset=bits[7], reset_less=True)  # Negative
+        self.V = Signal(reset=bits[6], reset_less=True)  # oVerflow
+        self.P = Signal(reset=bits[5], reset_less=True)  # direct Page
+        self.B = Signal(reset=bits[4], reset_less=True)  # Break
+        self.H = Signal(reset=bits[3], reset_less=True)  # Half carry
+        self.I = Signal(reset=bits[2], reset_less=True)  # Interrupt enabled (unused)
+        self.Z = Signal(reset=bits[1], reset_less=True)  # Zero
+        self.C = Signal(reset=bits[0], reset_less=True)  # Carry
 
     def __eq__(self, other: Status):
         return (
@@ -43,13 +45,14 @@ class Status:
 
 
 class Registers:
-    def __init__(self):
-        self.A = Signal(8, reset_less=True)
-        self.X = Signal(8, reset_less=True)
-        self.Y = Signal(8, reset_less=True)
-        self.SP = Signal(8, reset_less=True)
-        self.PC = Signal(16, reset_less=True)
-        self.PSW = Status()
+    def __init__(self, A=0, X=0, Y=0, SP=0, PC=0, PSW=0):
+        """The arguments are the power on values, e.g. from a saved state"""
+        self.A = Signal(8, reset=A, reset_less=True)
+        self.X = Signal(8, reset=X, reset_less=True)
+        self.Y = Signal(8, reset=Y, reset_less=True)
+        self.SP = Signal(8, reset=SP, reset_less=True)
+        self.PC = Signal(16, reset=PC, reset_less=True)
+        self.PSW = Status(PSW)
 
     def __eq__(self, other: Registers):
         return (
@@ -73,16 +76,14 @@ class Registers:
 
 
 def add8(value: Value, incr) -> Value:
-    """Add incr to a 8 bit value in little endiann"""
+    """Add incr to a 8 bit value, wrapping around"""
     if type(incr) is not int:
         raise TypeError
-    t = Cat(value[4:8], value[0:4]) + incr
-    return Cat(t[4:8], t[0:4])
+    return (value + incr)[0:8]
 
 
 def add16(value: Value, incr: int) -> Value:
-    """Add incr to a 16 bit value in little endiann"""
+    """Add incr to a 16 bit value, wrapping around"""
     if type(incr) is not int:
         raise TypeError
-    t = Cat(value[12:16], value[8:12], value[4:8], value[0:4]) + incr
-    return Cat(t[12:16], t[8:12], t[4:8], t[0:4])
+    return (value + incr)[0:16]
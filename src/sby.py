@@ -0,0 +1,99 @@
+# sby.py: SymbiYosys configurations of the formal checks, depth from cycle counts
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+import sys
+from argparse import ArgumentParser
+from typing import List, Sequence
+
+from alu import Operation
+from instruction import Instruction, implemented
+
+# prove is k-induction, it also covers unbounded time. cover only checks that every
+# Cover statement is reached, it proves nothing about the asserts
+MODES = ["bmc", "prove", "cover"]
+
+# core.py: reset, a cycle before the snapshot, then the check on the cycle after
+SETUP = 4
+
+# ALU_big counts of the multi cycle operations, every other one takes a cycle
+COUNTS = {Operation.MUL: 10, Operation.DIV: 13}
+
+# engines verify.py can race, the cover task runs on the smtbmc solver
+ENGINES = {
+    "boolector": "smtbmc boolector",
+    "yices": "smtbmc yices",
+    "z3": "smtbmc z3",
+    "pdr": "abc pdr",  # prove mode only
+}
+
+
+def engines(mode: str) -> List[str]:
+    """The engines that can run mode"""
+    return [e for e in ENGINES if mode == "prove" or not ENGINES[e].startswith("abc")]
+
+
+def instruction(name: str) -> Instruction:
+    """The implemented instruction called module.class, as core.py --instr"""
+    for i in implemented.implemented:
+        if name == implemented.name(i):
+            return i
+    raise KeyError(name)
+
+
+def depth(top: str, name: str) -> int:
+    """Cycles the check of the instruction or ALU operation needs to finish"""
+    if top == "core":
+        return len(instruction(name).microcode) + SETUP
+    return COUNTS.get(Operation[name], 1) + 2  # reset and the check after
+
+
+def config(
+    top: str, depth: int, modes: Sequence[str] = ("bmc",), engine: str = "boolector"
+) -> str:
+    """A cover task and one per mode, reading top.il from the working directory.
+    sby runs all of them unless it is given the task to run"""
+    modes = [mode for mode in modes if mode != "cover"]
+    tasks = "\n".join(["cover", *modes])
+    options = [f"{task}: mode {task}" for task in ["cover", *modes]]
+    # the end of the check is covered by Fell, seen the cycle after it
+    options += [f"cover: depth {depth + 1}"]
+    options += [f"{mode}: depth {depth}" for mode in modes]
+    options = "\n".join(options)
+    cover = ENGINES[engine if ENGINES[engine].startswith("smtbmc") else "boolector"]
+    lines = [f"cover: {cover}"] + [f"{mode}: {ENGINES[engine]}" for mode in modes]
+    lines = "\n".join(lines)
+    return f"""# generated by sby.py
+
+[tasks]
+{tasks}
+
+[options]
+{options}
+multiclock off
+
+[engines]
+{lines}
+
+[script]
+read_rtlil {top}.il
+prep -top top
+memory_map -rom-only
+opt -fast
+
+[files]
+{top}.il
+"""
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="print the sby file of a formal check")
+    parser.add_argument("top", choices=["core", "alu"])
+    parser.add_argument("name", help="module.class instruction or ALU operation")
+    parser.add_argument("--mode", choices=MODES, default="bmc")
+    parser.add_argument("--engine", choices=ENGINES, default="boolector")
+    args = parser.parse_args()
+
+    if args.engine not in engines(args.mode):
+        parser.error(f"{args.engine} does not run {args.mode}")
+    cycles = depth(args.top, args.name)
+    sys.stdout.write(config(args.top, cycles, [args.mode], args.engine))
@@ -0,0 +1,76 @@
+# simbench.py: Simulated cycles per second of Core on every simulation backend
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import List, Tuple
+
+from nmigen import Module, Signal
+from nmigen.sim import Delay, Simulator
+
+from alu import Multiplier
+from aram import ARAM
+from bus import BusModel
+from core import Core
+from cxxsim import CxxSimulator
+from model import program
+
+
+def bench(
+    backend,
+    cycles: int,
+    mem: bytes,
+    multiplier: Multiplier = Multiplier.ITERATIVE,
+    turbo: bool = False,
+) -> Tuple[float, float]:
+    """Cycles per second, not counting elaboration or compilation, and the cycles
+    per instruction of the program"""
+    m = Module()
+    m.submodules.core = core = Core(multiplier=multiplier, turbo=turbo)
+    started = Signal(32)  # instructions
+    m.d.sync += started.eq(started + (core.cycle == 1))
+
+    count: List[int] = []
+    if backend is Simulator:
+        sim = Simulator(m)
+        sim.add_process(BusModel(mem).process(core))
+
+        def process():
+            yield Delay((cycles - 0.25) * 1e-6)  # after the last edge
+            count.append((yield started))
+
+        sim.add_process(process)
+    else:
+        m.submodules.aram = aram = ARAM(mem)
+        m.d.comb += aram.connect(core)
+        sim = backend(m)
+    sim.add_clock(1e-6, domain="sync")
+    start = perf_counter()
+    sim.run_until(cycles * 1e-6, run_passive=True)
+    rate = cycles / (perf_counter() - start)
+    if backend is not Simulator:
+        count.append(sim.read(started))
+    return rate, cycles / count[0]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="benchmark the simulation backends")
+    parser.add_argument("--cycles", type=int, default=100_000)
+    parser.add_argument("--backend", choices=["pysim", "cxxrtl"], nargs="+")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--opcodes", type=lambda x: int(x, 16), nargs="+", help="program opcodes"
+    )
+    parser.add_argument(
+        "--mul", choices=[x.value for x in Multiplier], default="iterative"
+    )
+    parser.add_argument("--turbo", action="store_true", help="Core(turbo)")
+    args = parser.parse_args()
+
+    mem = program(args.seed, 0x4000, args.opcodes)
+    backends = {"pysim": Simulator, "cxxrtl": CxxSimulator}
+    for name in args.backend or backends:
+        rate, cpi = bench(
+            backends[name], args.cycles, mem, Multiplier(args.mul), args.turbo
+        )
+        print(f"{name:<8} {rate:14,.0f} cycles/s  {cpi:6.3f} cycles/instruction")
@@ -23,31 +23,38 @@ from registers import Registers
 
 
 class Snapshot:
-    def __init__(self):
+    def __init__(self, reads: int = 8, writes: int = 8):
+        """Room for reads and writes bus accesses, the counters go one further so
+        an instruction that does more still fails its checks"""
         self.taken = Signal(reset=0)
 
         self.pre = Registers()
         self.post = Registers()
 
-        self.addresses_written = Signal(3, reset=0)
-        self.write_addr = Array([Signal(16) for _ in range(8)])
-        self.write_data = Array([Signal(8) for _ in range(8)])
+        self.addresses_written = Signal(range(writes + 2), reset=0)
+        self.write_addr = Array([Signal(16) for _ in range(writes)])
+        self.write_data = Array([Signal(8) for _ in range(writes)])
 
-        self.addresses_read = Signal(3, reset=0)
-        self.read_addr = Array([Signal(16) for _ in range(8)])
-        self.read_data = Array([Signal(8) for _ in range(8)])
+        self.addresses_read = Signal(range(max(reads, 1) + 2), reset=0)
+        self.read_addr = Array([Signal(16) for _ in range(max(reads, 1))])
+        self.read_data = Array([Signal(8) for _ in range(max(reads, 1))])
+
+    @staticmethod
+    def _record(m: Module, count: Signal, addrs: Array, datas: Array, addr, data):
+        with m.If(count <= len(addrs)):
+            m.d.sync += count.eq(count + 1)
+        if len(addrs):
+            with m.If(count < len(addrs)):
+                m.d.sync += addrs[count].eq(addr)
+                m.d.sync += datas[count].eq(data)
 
     def read(self, m: Module, addr: Value, data: Value):
-        with m.If(self.addresses_read != 7):
-            m.d.sync += self.addresses_read.eq(self.addresses_read + 1)
-            m.d.sync += self.read_addr[self.addresses_read].eq(addr)
-            m.d.sync += self.read_data[self.addresses_read].eq(data)
+        self._record(m, self.addresses_read, self.read_addr, self.read_data, addr, data)
 
     def write(self, m: Module, addr: Value, data: Value):
-        with m.If(self.addresses_written != 7):
-            m.d.sync += self.addresses_written.eq(self.addresses_written + 1)
-            m.d.sync += self.write_addr[self.addresses_written].eq(addr)
-            m.d.sync += self.write_data[self.addresses_written].eq(data)
+        self._record(
+            m, self.addresses_written, self.write_addr, self.write_data, addr, data
+        )
 
     def pre_snapshot(self, m: Module, addr: Value, data: Value, reg: Registers):
         """take a synchronous snapshot including addr and data read from ram"""
@@ -0,0 +1,247 @@
+# spc.py: SPC snapshot loader and headless playback runner
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Callable, Generator, List, NamedTuple, Optional, Sequence, Tuple
+
+from nmigen import Elaboratable, EnableInserter, Module, Mux, Signal
+from nmigen.build import Platform
+from nmigen.sim import Passive, Settle, Simulator, Tick
+
+from aram import ARAM
+from bus import BusModel
+from core import Core
+from cxxsim import CxxSimulator
+from dsp import CLOCK as DSP_CLOCK
+from dsp import DSP, save
+from profiler import Profiler
+from registers import Registers
+
+CLOCK = 1_024_000  # SPC-700 cycles per second
+RATIO = DSP_CLOCK // CLOCK  # DSP cycles per core cycle
+
+DSPADDR = 0xF2  # IO port selecting a DSP register
+DSPDATA = 0xF3  # IO port reading and writing it
+
+MAGIC = b"SNES-SPC700 Sound File Data"
+SIZE = 0x10200
+
+
+class SPC(NamedTuple):
+    """Saved state of the sound module, see the .spc file format"""
+
+    title: str
+    PC: int
+    A: int
+    X: int
+    Y: int
+    PSW: int
+    SP: int
+    ram: bytes  # 64 KiB, includes the 0xF0-0xFF IO ports
+    dsp: bytes  # 128 DSP registers
+
+    @classmethod
+    def parse(cls, data: bytes) -> "SPC":
+        if not data.startswith(MAGIC):
+            raise ValueError("not an SPC file")
+        if len(data) < SIZE:
+            raise ValueError(f"SPC file truncated at {len(data)} bytes")
+        title = b""
+        if data[0x23] == 26:  # has an ID666 tag
+            title = data[0x2E:0x4E].split(b"\0")[0]
+        return cls(
+            title=title.decode("latin-1").strip(),
+            PC=data[0x25] | data[0x26] << 8,
+            A=data[0x27],
+            X=data[0x28],
+            Y=data[0x29],
+            PSW=data[0x2A],
+            SP=data[0x2B],
+            ram=data[0x100:0x10100],
+            dsp=data[0x10100:0x10180],
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "SPC":
+        with open(path, "rb") as f:
+            return cls.parse(f.read())
+
+    def registers(self) -> Registers:
+        return Registers(self.A, self.X, self.Y, self.SP, self.PC, self.PSW)
+
+
+class Ports(Elaboratable):
+    """Bus of the core towards the ARAM, with the DSP registers behind DSPADDR and
+    DSPDATA. Everything runs on the DSP clock, RATIO times the core's, and tick is
+    high on the cycle the core steps so the core goes under EnableInserter(tick).
+    The ARAM side is named like the core's bus, for aram.connect and BusModel."""
+
+    def __init__(self, core: Core, dsp: DSP, dspaddr: int = 0):
+        self.core = core
+        self.dsp = dsp
+        self.tick = Signal()
+
+        self.addr = Signal(16)
+        self.din = Signal(8)  # written by the core
+        self.dout = Signal(8)  # read by the core
+        self.RWB = Signal(reset=1)  # 1 = read, 0 = write
+        self.enable = Signal(reset=1)
+
+        self.dspaddr = Signal(8, reset=dspaddr)
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+        core, dsp = self.core, self.dsp
+
+        phase = Signal(range(RATIO))
+        m.d.sync += phase.eq(Mux(self.tick, 0, phase + 1))
+        m.d.comb += self.tick.eq(phase == RATIO - 1)
+
+        # the DSP answers reg_dout a cycle late, well within a cycle of the core
+        m.d.comb += [
+            self.addr.eq(core.addr),
+            self.din.eq(core.din),
+            self.RWB.eq(core.RWB),
+            self.enable.eq(core.enable),
+            core.dout.eq(Mux(core.addr == DSPDATA, dsp.reg_dout, self.dout)),
+            dsp.reg_addr.eq(self.dspaddr),
+            dsp.reg_din.eq(core.din),
+        ]
+        write = self.tick & core.enable & ~core.RWB
+        with m.If(write & (core.addr == DSPADDR)):
+            m.d.sync += self.dspaddr.eq(core.din)
+        # registers 0x80-0xFF read as 0x00-0x7F, writes to them are dropped
+        m.d.comb += dsp.reg_we.eq(write & (core.addr == DSPDATA) & ~self.dspaddr[7])
+
+        return m
+
+
+def stretched(process: Callable[[], Generator]) -> Callable[[], Generator]:
+    """The process with every Tick made RATIO of them, it sees the cycles of the
+    core rather than those of the DSP"""
+
+    def wrapper():
+        inner = process()
+        response = None
+        while True:
+            try:
+                command = inner.send(response)
+            except StopIteration:
+                return
+            if isinstance(command, Tick):
+                for _ in range(RATIO):
+                    response = yield command
+            else:
+                response = yield command
+
+    return wrapper
+
+
+def run(
+    spc: SPC,
+    cycles: int,
+    backend: str = "cxxrtl",
+    trace: Optional[str] = None,
+    signals: Sequence[str] = ("bus",),
+    window: Tuple[int, Optional[int]] = (0, None),
+    profile: Optional[str] = None,
+    output: Optional[str] = None,
+) -> float:
+    """Simulate the core and the DSP from the snapshot, sharing the ARAM, returns
+    the simulated clock rate of the core in Hz not counting elaboration or
+    compilation. Nothing is traced unless trace names a waveform file, then only
+    signals during the window of cycles. With profile, the cycles of every opcode
+    are reported and saved there as collapsed stacks. With output, the samples of
+    the DSP are written there as a .wav file."""
+    m = Module()
+    core = Core(reg=spc.registers())
+    m.submodules.dsp = dsp = DSP(spc.dsp)
+    m.submodules.ports = ports = Ports(core, dsp, spc.ram[DSPADDR])
+    m.submodules.core = EnableInserter(ports.tick)(core)
+    if backend == "cxxrtl":
+        m.submodules.aram = aram = ARAM(spc.ram)
+        m.d.comb += aram.connect(ports) + aram.connect_dsp(dsp)
+        sim = CxxSimulator(m)
+    else:
+        sim = Simulator(m)
+        bus = BusModel(spc.ram)
+        sim.add_process(bus.process(ports))
+        sim.add_process(bus.dsp_process(dsp))
+    sim.add_clock(1 / DSP_CLOCK, domain="sync")
+    tracer = None
+    if trace is not None:
+        # pyvcd is only needed when a trace is asked for
+        from waves import Tracer, select
+
+        tracer = Tracer(trace, select(core, list(signals), sim), *window)
+        sim.add_process(stretched(tracer.process()))
+    profiler = None
+    if profile is not None:
+        profiler = Profiler(core)
+        sim.add_process(stretched(profiler.process()))
+    samples: List[int] = []
+    if output is not None:
+
+        def record():
+            yield Passive()
+            while True:
+                yield Tick()
+                yield Settle()
+                if (yield dsp.valid):
+                    samples.extend([(yield dsp.left), (yield dsp.right)])
+
+        sim.add_process(record)
+
+    start = perf_counter()
+    sim.run_until(cycles / CLOCK, run_passive=True)
+    rate = cycles / (perf_counter() - start)
+    if tracer is not None:
+        tracer.close()
+    if profiler is not None:
+        profiler.report()
+        profiler.save(profile)
+    if output is not None:
+        save(output, samples)
+    return rate
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="run an SPC snapshot, core and DSP, without tracing"
+    )
+    parser.add_argument("file", help=".spc snapshot")
+    length = parser.add_mutually_exclusive_group()
+    length.add_argument("--cycles", type=int)
+    length.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--backend", choices=["pysim", "cxxrtl"], default="cxxrtl")
+    parser.add_argument("--trace", help="waveform file: .vcd, .vcd.gz or .fst")
+    parser.add_argument(
+        "--signals", nargs="+", default=["bus"], help="groups or group.name to trace"
+    )
+    parser.add_argument("--start", type=int, default=0, help="first cycle traced")
+    parser.add_argument("--stop", type=int, help="cycle the trace ends before")
+    parser.add_argument("--profile", help="collapsed stacks of the cycles per opcode")
+    parser.add_argument("-o", "--output", help="write the DSP samples to a .wav file")
+    args = parser.parse_args()
+
+    spc = SPC.load(args.file)
+    cycles = args.cycles if args.cycles is not None else round(args.seconds * CLOCK)
+
+    print(
+        f"{spc.title or args.file}: PC={spc.PC:04X} A={spc.A:02X} X={spc.X:02X}"
+        f" Y={spc.Y:02X} SP={spc.SP:02X} PSW={spc.PSW:02X}"
+    )
+    window = (args.start, args.stop)
+    rate = run(
+        spc,
+        cycles,
+        args.backend,
+        args.trace,
+        args.signals,
+        window,
+        args.profile,
+        args.output,
+    )
+    print(f"{cycles:,} cycles ({cycles / CLOCK:.2f}s of audio)")
+    print(f"{rate:,.0f} Hz simulated, {rate / CLOCK:.2f}x real time")
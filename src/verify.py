@@ -0,0 +1,281 @@
+# verify.py: Run the formal checks of every instruction and ALU operation in parallel
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+from time import perf_counter, sleep
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from alu import Divider, Multiplier, Operation
+from cache import ProofCache
+from deps import Green, sources, strays
+from instruction import implemented
+from sby import ENGINES, MODES, config, depth, engines
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+SBY = os.environ.get("SBY", "sby")
+POLL = 0.05  # seconds between checks on the racing engines
+UNREACHED = "Unreached cover statement at "  # sby log line of a failed cover
+
+
+class Target(NamedTuple):
+    top: str  # "core" or "alu", names both the runner script and its sby file
+    flag: str
+    name: str
+    options: Tuple[str, ...] = ()  # more runner arguments, e.g. a variant
+
+    def __str__(self) -> str:
+        return " ".join([self.top, self.name, *self.options])
+
+    @property
+    def slug(self) -> str:
+        """Unique name for the working directory"""
+        return "_".join([self.top, self.name, *self.options]).replace("-", "")
+
+
+class Result(NamedTuple):
+    target: Target
+    status: str  # PASS, FAIL or ERROR
+    time: float
+    detail: str = ""  # counterexample trace or error output
+    cached: bool = False
+    engine: str = ""  # the one that answered first
+
+
+# operations with more than one implementation: instruction, runner flag, choices
+VARIANTS = {
+    Operation.MUL: ("implied.MUL", "--mul", Multiplier),
+    Operation.DIV: ("implied.DIV", "--div", Divider),
+}
+
+
+def targets() -> List[Target]:
+    """Every implemented instruction and every ALU operation, MUL and DIV once for
+    every implementation"""
+    instrs = [
+        Target("core", "--instr", implemented.name(i)) for i in implemented.implemented
+    ]
+    opers = [Target("alu", "--oper", o.name) for o in Operation]
+    for oper, (instr, flag, choices) in VARIANTS.items():
+        default = [t for t in instrs if t.name == instr]
+        for variant in list(choices)[1:]:
+            options = (flag, variant.value)
+            instrs += [t._replace(options=options) for t in default]
+            opers += [Target("alu", "--oper", oper.name, options)]
+    return instrs + opers
+
+
+def generate(target: Target) -> str:
+    """Elaborate the target and return its RTLIL"""
+    cmd = [sys.executable, f"{target.top}.py", target.flag, target.name]
+    cmd += target.options
+    proc = subprocess.run(
+        cmd + ["generate", "-t", "il"], cwd=SRC, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    return proc.stdout
+
+
+def prove(
+    target: Target, il: str, configs: Dict[str, str], workdir: str, mode: str
+) -> Result:
+    """Race sby on the mode task of every engine config on the RTLIL, each in a
+    directory of its own inside workdir. The first PASS or FAIL wins and the
+    others are killed. A cover FAIL names the unreached statements instead of a
+    trace, the traces it leaves reach the others. The output of sby goes to
+    sby.log in the engine directory, a pipe nobody reads would fill and block it"""
+    shutil.rmtree(workdir, ignore_errors=True)  # no stale traces of other modes
+    running: Dict[str, subprocess.Popen] = {}
+    start = perf_counter()
+    result = Result(target, "ERROR", 0.0, "no engine")
+    try:
+        # started inside the try, a failure to start one still kills the others
+        for engine, sby in configs.items():
+            engine_dir = os.path.join(workdir, engine)
+            os.makedirs(engine_dir)
+            with open(os.path.join(engine_dir, f"{target.top}.il"), "w") as f:
+                f.write(il)
+            with open(os.path.join(engine_dir, f"{target.top}.sby"), "w") as f:
+                f.write(sby)
+            with open(os.path.join(engine_dir, "sby.log"), "w") as log:
+                running[engine] = subprocess.Popen(
+                    [SBY, "-f", f"{target.top}.sby", mode],
+                    cwd=engine_dir,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    start_new_session=True,  # sby starts the solvers, kill them too
+                )
+
+        while running:
+            done = [e for e, proc in running.items() if proc.poll() is not None]
+            if not done:
+                sleep(POLL)
+                continue
+            for engine in done:
+                proc = running.pop(engine)
+                elapsed = perf_counter() - start
+                if proc.returncode == 0:
+                    return Result(target, "PASS", elapsed, engine=engine)
+                with open(os.path.join(workdir, engine, "sby.log")) as f:
+                    lines = f.read().strip().split("\n")
+                task = f"{target.top}_{mode}"
+                traces = glob(
+                    os.path.join(workdir, engine, task, "engine_*", "trace*.vcd")
+                )
+                unreached = [
+                    line.split(UNREACHED)[-1] for line in lines if UNREACHED in line
+                ]
+                if proc.returncode == 2 and mode == "cover" and unreached:
+                    detail = f"unreached {', '.join(unreached)}"
+                    return Result(target, "FAIL", elapsed, detail, engine=engine)
+                if proc.returncode == 2 and mode != "cover" and traces:
+                    return Result(target, "FAIL", elapsed, traces[0], engine=engine)
+                # unknown, timeout or error, another engine may still decide
+                last = lines[-1]
+                result = Result(target, "ERROR", elapsed, f"{engine}: {last}")
+        return result
+    finally:
+        for proc in running.values():
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            proc.wait()
+
+
+def run(
+    target: Target,
+    directory: str,
+    cache: Optional[str] = None,
+    mode: str = "bmc",
+    racers: Sequence[str] = ("boolector",),
+) -> Result:
+    """Generate and prove a single target, meant to run in a worker process.
+    Every engine gives the same answer, so the cache key ignores which one ran"""
+    start = perf_counter()
+    workdir = os.path.join(directory, target.slug)
+    try:
+        il = generate(target)
+        cycles = depth(target.top, target.name)
+        if cache is not None:
+            store = ProofCache(cache)
+            key = store.key(il, config(target.top, cycles, [mode]))
+            entry = store.get(key)
+            if entry is not None:
+                elapsed = perf_counter() - start
+                return Result(target, entry.status, elapsed, entry.trace, True)
+        configs = {e: config(target.top, cycles, [mode], e) for e in racers}
+        result = prove(target, il, configs, workdir, mode)
+    except (RuntimeError, OSError) as e:
+        return Result(target, "ERROR", perf_counter() - start, str(e).strip())
+
+    if cache is not None:
+        trace = result.detail if result.detail.endswith(".vcd") else ""
+        store.put(key, result.status, trace)
+    return result._replace(time=perf_counter() - start)
+
+
+def save(results: List[Result], path: str, mode: str):
+    """Merge the results into the JSON file of the last result of every target.
+    Cached results keep the time of the proof they come from"""
+    try:
+        with open(path) as f:
+            last = json.load(f)
+    except (OSError, ValueError):
+        last = {}
+    for r in results:
+        entry = {"status": r.status, "time": r.time, "engine": r.engine, "mode": mode}
+        if r.cached and str(r.target) in last:
+            entry["time"] = last[str(r.target)]["time"]
+            entry["engine"] = last[str(r.target)]["engine"]
+        last[str(r.target)] = entry
+    with open(path, "w") as f:
+        json.dump(last, f, indent=2, sort_keys=True)
+
+
+def report(results: List[Result]):
+    width = max(len(str(r.target)) for r in results)
+    print(f"{'target':<{width}}  result  time")
+    for r in results:
+        cached = " (cached)" if r.cached else f" ({r.engine})" if r.engine else ""
+        print(f"{str(r.target):<{width}}  {r.status:<6}  {r.time:7.2f}s{cached}")
+        if r.detail:
+            print(f"{'':<{width}}  {r.detail}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="formal verification of every target")
+    parser.add_argument("names", nargs="*", help="only run these targets")
+    parser.add_argument("-j", "--jobs", type=int, help="defaults to cores / engines")
+    parser.add_argument("--dir", default="formal", help="sby working directory")
+    parser.add_argument("--cache", help="result cache, defaults to DIR/cache")
+    parser.add_argument("--no-cache", action="store_true", help="always run sby")
+    parser.add_argument(
+        "--mode",
+        choices=MODES,
+        default="bmc",
+        help="prove runs k-induction, cover checks every Cover is reached",
+    )
+    parser.add_argument(
+        "--engines", choices=ENGINES, nargs="+", help="race these, default all"
+    )
+    parser.add_argument(
+        "--changed",
+        action="store_true",
+        help="only targets whose sources changed since they last passed",
+    )
+    args = parser.parse_args()
+
+    racers = args.engines or engines(args.mode)
+    for engine in set(racers) - set(engines(args.mode)):
+        parser.error(f"{engine} does not run {args.mode}")
+    workers = args.jobs or max(1, os.cpu_count() // len(racers))
+
+    jobs = targets()
+    if args.names:
+        jobs = [t for t in jobs if {t.name, t.name.split(".")[-1]} & set(args.names)]
+
+    directory = os.path.abspath(args.dir)
+    green = Green(os.path.join(directory, "green.json"))
+    files = {t: sources(t.top, t.name) for t in jobs}
+    for t in jobs:
+        if strays(files[t]):
+            parser.error(f"{t} is built from {', '.join(sorted(strays(files[t])))}")
+    key = {t: f"{args.mode} {t}" for t in jobs}
+    if args.changed:
+        skipped = len(jobs)
+        jobs = [t for t in jobs if green.changed(key[t], files[t])]
+        print(f"{skipped - len(jobs)} targets unchanged since they passed")
+        if not jobs:
+            sys.exit(0)
+
+    cache = None if args.no_cache else args.cache or os.path.join(directory, "cache")
+    results: List[Result] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(run, t, directory, cache, args.mode, racers) for t in jobs
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            via = f", {result.engine}" if result.engine else ""
+            via = ", cached" if result.cached else via
+            print(f"{result.status:<6} {result.target} ({result.time:.2f}s{via})")
+            results.append(result)
+
+    for r in results:
+        if r.status == "PASS":
+            green.record(key[r.target], files[r.target])
+    green.save()
+    save(results, os.path.join(directory, "results.json"), args.mode)
+
+    results.sort(key=lambda r: jobs.index(r.target))
+    report(results)
+    sys.exit(any(r.status != "PASS" for r in results))
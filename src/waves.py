@@ -0,0 +1,116 @@
+# waves.py: Waveforms of a chosen set of core signals over a window of cycles
+# Copyright (C) 2021 Martín Bárez <martinbarez>
+
+import gzip
+import io
+import os
+import subprocess
+from typing import Callable, Dict, Generator, List, Optional
+
+from nmigen import Signal
+from nmigen.sim import Passive, Settle, Tick
+from vcd import VCDWriter
+
+VCD2FST = os.environ.get("VCD2FST", "vcd2fst")
+
+
+def groups(core) -> Dict[str, Dict[str, Signal]]:
+    """Signals that can be traced by group name, core.ports() is in bus"""
+    reg = core.reg
+    return {
+        "bus": {
+            "addr": core.addr,
+            "din": core.din,
+            "dout": core.dout,
+            "RWB": core.RWB,
+            "enable": core.enable,
+        },
+        "regs": {"A": reg.A, "X": reg.X, "Y": reg.Y, "SP": reg.SP, "PC": reg.PC},
+        "psw": {flag: getattr(reg.PSW, flag) for flag in "NVPBHIZC"},
+        "exec": {"cycle": core.cycle, "opcode": core.opcode, "tmp": core.tmp},
+    }
+
+
+def select(core, names: List[str], sim=None) -> Dict[str, Signal]:
+    """Signals by group, like bus, or by group and name, like regs.A. With a
+    CxxSimulator the ones its build optimized away are left out"""
+    available = groups(core)
+    signals = {}
+    for name in names:
+        group, _, signal = name.partition(".")
+        if group not in available or signal and signal not in available[group]:
+            raise KeyError(f"no signal {name}, groups: {', '.join(available)}")
+        for key, value in available[group].items():
+            if not signal or key == signal:
+                signals[f"{group}.{key}"] = value
+    if hasattr(sim, "visible"):
+        signals = {name: s for name, s in signals.items() if sim.visible(s)}
+    return signals
+
+
+class Tracer:
+    """Records signals once per cycle from start up to but not including stop, in
+    a simulator process. Only changes are written, streamed as they happen.
+    The format follows the path: .vcd, .vcd.gz, or .fst through vcd2fst"""
+
+    def __init__(
+        self,
+        path: str,
+        signals: Dict[str, Signal],
+        start: int = 0,
+        stop: Optional[int] = None,
+    ):
+        self.path = path
+        self.signals = signals
+        self.start = start
+        self.stop = stop
+
+        self.proc: Optional[subprocess.Popen] = None
+        if path.endswith(".fst"):
+            self.proc = subprocess.Popen(
+                [VCD2FST, "-", path], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL
+            )
+            self.file = io.TextIOWrapper(self.proc.stdin)
+        elif path.endswith(".gz"):
+            self.file = gzip.open(path, "wt")
+        else:
+            self.file = open(path, "w")
+
+        # timestamps count cycles
+        self.writer = VCDWriter(self.file, timescale="1 us", init_timestamp=start)
+        self.vars = {
+            name: self.writer.register_var(
+                name.split(".")[0], name.split(".")[1], "wire", size=len(signal)
+            )
+            for name, signal in signals.items()
+        }
+
+    def process(self) -> Callable[[], Generator]:
+        def process():
+            yield Passive()
+            last: Dict[str, int] = {}
+            cycle = 0
+            while self.stop is None or cycle < self.stop:
+                if cycle >= self.start:
+                    yield Settle()
+                    yield Settle()  # after the bus answered on dout
+                    for name, signal in self.signals.items():
+                        value = yield signal
+                        if last.get(name) != value:
+                            self.writer.change(self.vars[name], cycle, value)
+                            last[name] = value
+                yield Tick()
+                cycle += 1
+            self.close()
+
+        return process
+
+    def close(self):
+        """Finish the file, the process does it on its own at stop"""
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.writer = None
+        self.file.close()
+        if self.proc is not None and self.proc.wait() != 0:
+            raise RuntimeError(f"{VCD2FST} failed on {self.path}")
@@ -12,7 +12,8 @@ echo "Py time: $SECONDS"
 if [[ "$COMPILE" !=  "" ]]; then
 	echo "$COMPILE"
 else
-	FORMAL="sby -f ${dir}core.sby"
+	python3 ${dir}sby.py core $1 ${2:+--mode $2} > core.sby
+	FORMAL="sby -f core.sby"
 	RESULT=$($FORMAL | grep 'DONE\|Assert failed')
 	echo "$RESULT"
 	echo "Total time: $SECONDS"